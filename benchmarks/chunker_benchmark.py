@@ -0,0 +1,68 @@
+"""
+Compares chunker.split_text with langchain's RecursiveCharacterTextSplitter
+
+Checks that both produce the same chunks on random documents, then measures chunks per second. langchain is not a
+dependency of canvas_grab, so the benchmark is skipped when it is not installed.
+
+Usage: python benchmarks/chunker_benchmark.py [number of documents]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chunker import split_text, MAX_CHUNK_SIZE, CHUNK_OVERLAP  # noqa: E402
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "x" * 1500, "the", "of", "and", "for", "lecture", "homework",
+         "consectetur", "a", "\t", "  "]
+GAPS = [" ", " ", " ", " ", "\n", "\n\n", "\n\n\n", " \n ", ""]
+# (chunk_size, chunk_overlap) pairs checked for equivalence besides the defaults
+SETTINGS = [(50, 10), (7, 3), (2, 1), (3, 0)]
+
+
+def random_document(rng):
+    """
+    Returns prose mixed with long unbroken tokens and irregular whitespace
+    """
+    parts = []
+    for _ in range(rng.randint(1, 400)):
+        parts.append(rng.choice(WORDS) if rng.random() < .98 else "y" * rng.randint(900, 2500))
+        parts.append(rng.choice(GAPS))
+    return "".join(parts)
+
+
+def main(count=1000):
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        print("langchain is not installed, skipping")
+        return 0
+
+    rng = random.Random(1)
+    documents = [random_document(rng) for _ in range(count)]
+    documents += ["", " ", "\n\n", "a" * 5000, "\n\nPage 1\n" + "b " * 3000]
+
+    mismatches = 0
+    for chunk_size, chunk_overlap in [(MAX_CHUNK_SIZE, CHUNK_OVERLAP)] + SETTINGS:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        sample = documents if chunk_size == MAX_CHUNK_SIZE else documents[:300]
+        bad = sum(splitter.split_text(d) != split_text(d, chunk_size, chunk_overlap) for d in sample)
+        print(f"chunk_size={chunk_size} chunk_overlap={chunk_overlap}: {bad} mismatches of {len(sample)}")
+        mismatches += bad
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=MAX_CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    size = sum(map(len, documents))
+    for name, split in [("langchain", splitter.split_text), ("chunker", split_text)]:
+        start = time.perf_counter()
+        chunks = sum(len(split(d)) for d in documents)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {chunks} chunks in {elapsed:.2f}s, {chunks / elapsed:.0f} chunks/s, "
+              f"{size / elapsed / 1e6:.1f} MB/s")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
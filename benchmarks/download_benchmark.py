@@ -0,0 +1,83 @@
+"""
+Measures single-stream download throughput with 1 KiB reads against chunk_size_for
+
+A file of random bytes is served on loopback by http.server's ThreadingHTTPServer and downloaded with download_file,
+first reading 1 KiB chunks, then chunks sized by chunk_size_for. The best of several runs is reported for each. The
+benchmark fails if a download differs from the served file, or if adaptive chunks are not faster.
+
+Usage: python benchmarks/download_benchmark.py [file size in MiB]
+"""
+
+import filecmp
+import functools
+import http.server
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from canvas_grab.download_file import download_file  # noqa: E402
+
+download_module = importlib.import_module("canvas_grab.download_file")
+
+RUNS = 3
+SMALL_CHUNK_SIZE = 1024
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def throughput(url, served_path, file_size, target):
+    """
+    Returns the best MB/s of RUNS downloads of url into target
+    """
+    best = 0
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        for _ in download_file(url, "benchmark", target, file_size):
+            pass
+        best = max(best, file_size / (time.perf_counter() - start) / 2 ** 20)
+        if not filecmp.cmp(served_path, target, shallow=False):
+            raise AssertionError(f"{target} differs from {served_path}")
+        os.remove(target)
+    return best
+
+
+def main(size_mib=256):
+    chunk_size_for = download_module.chunk_size_for
+    with tempfile.TemporaryDirectory() as folder:
+        served_path = os.path.join(folder, "served.bin")
+        file_size = size_mib * 2 ** 20
+        with open(served_path, "wb") as f:
+            for _ in range(size_mib):
+                f.write(os.urandom(2 ** 20))
+
+        server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), functools.partial(QuietHandler, directory=folder))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/served.bin"
+        target = os.path.join(folder, "downloaded.bin")
+        try:
+            download_module.chunk_size_for = lambda file_size: SMALL_CHUNK_SIZE
+            small = throughput(url, served_path, file_size, target)
+            download_module.chunk_size_for = chunk_size_for
+            adaptive = throughput(url, served_path, file_size, target)
+        finally:
+            download_module.chunk_size_for = chunk_size_for
+            server.shutdown()
+            server.server_close()
+
+    print(f"{size_mib} MiB, best of {RUNS} runs")
+    print(f"1 KiB chunks: {small:.0f} MB/s")
+    print(f"chunk_size_for ({chunk_size_for(file_size) // 1024} KiB): {adaptive:.0f} MB/s")
+    return 0 if adaptive > small else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
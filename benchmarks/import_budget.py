@@ -0,0 +1,91 @@
+"""
+Checks that importing clemson_canvas_grab stays cheap
+
+The import runs in a fresh interpreter. It must not load any of HEAVY_MODULES, which are only needed once a file is
+converted or a question is asked, and the best of several runs must stay under the budget. When the budget is
+exceeded, the slowest imports reported by ``-X importtime`` are printed. Every submodule of canvas_grab must also be
+listed in its SUBMODULES, or a fresh ``import canvas_grab`` cannot reach it as an attribute.
+
+Usage: python benchmarks/import_budget.py [budget in ms]
+"""
+
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pypdfium2", "docx", "pptx", "bs4", "questionary", "langchain"]
+BUDGET_MS = 400
+RUNS = 5
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the repository is imported as a package named after its folder
+PACKAGE = os.path.basename(REPO)
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import {PACKAGE}.clemson_canvas_grab
+elapsed = (time.perf_counter() - start) * 1000
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+UNLISTED_PROBE = f"""
+import pkgutil
+import {PACKAGE}.canvas_grab as canvas_grab
+print(','.join(module.name for module in pkgutil.iter_modules(canvas_grab.__path__)
+               if module.name not in canvas_grab.SUBMODULES))
+"""
+
+
+def probe():
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(REPO))
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    elapsed, _, loaded = output.splitlines()[-1].partition(" ")
+    return float(elapsed), [name for name in loaded.split(",") if name]
+
+
+def unlisted_submodules():
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(REPO))
+    output = subprocess.run([sys.executable, "-c", UNLISTED_PROBE], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return [name for name in output.strip().split(",") if name]
+
+
+def slowest_imports(count=10):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(REPO))
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {PACKAGE}.clemson_canvas_grab"],
+                            env=env, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(budget_ms=BUDGET_MS):
+    results = [probe() for _ in range(RUNS)]
+    best = min(elapsed for elapsed, _ in results)
+    loaded = results[0][1]
+    print(f"import {PACKAGE}.clemson_canvas_grab: best {best:.0f} ms of {RUNS} runs, budget {budget_ms} ms")
+    failed = False
+    if loaded:
+        print(f"heavy modules imported at startup: {', '.join(loaded)}")
+        failed = True
+    if best > budget_ms:
+        print("over budget, slowest imports (cumulative us):")
+        for cumulative, name in slowest_imports():
+            print(f"  {cumulative:>9} {name}")
+        failed = True
+    unlisted = unlisted_submodules()
+    if unlisted:
+        print(f"submodules missing from canvas_grab.SUBMODULES: {', '.join(unlisted)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(float, sys.argv[1:])))
@@ -0,0 +1,164 @@
+"""
+Measures Planner on synthetic snapshots of 100k and 1M entries
+
+Each snapshot pair mixes unchanged, updated, added, removed and moved files with page links. The plan of
+``Planner`` is checked against ``reference_plan``, the eager implementation it replaced, and its time and peak
+memory are compared with it. The benchmark fails if the plans differ, or if ``Planner`` is clearly slower or needs
+more memory than the reference.
+
+Usage: python benchmarks/plan_benchmark.py [number of entries ...]
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from canvas_grab.file_filter import FileFilter  # noqa: E402
+from canvas_grab.planner import Planner  # noqa: E402
+from canvas_grab.snapshot import SnapshotFile, SnapshotLink  # noqa: E402
+
+SIZES = [100_000, 1_000_000]
+# Planner may be this much slower than the reference before the benchmark fails, to absorb timing noise
+TIME_TOLERANCE = 1.2
+EXTENSIONS = [".pdf", ".pptx", ".docx", ".mp4", ".zip", ".png"]
+
+
+def synthetic_snapshots(count, seed=0):
+    """
+    Returns (remote, local) snapshots of about count entries. One entry in ten is a link, half of which exist
+    locally. Of the files, 80% are unchanged, 5% updated, 5% added, 5% removed and 5% moved to another folder.
+    """
+    rng = random.Random(seed)
+    remote, local = {}, {}
+    for i in range(count):
+        key = f"course{i % 50}/module{i % 997}/file{i}{EXTENSIONS[i % len(EXTENSIONS)]}"
+        if i % 10 == 0:
+            remote[key] = SnapshotLink(f"link {i}", f"https://example.com/{i}", f"module{i % 997}")
+            if i % 20 == 0:
+                local[key] = SnapshotFile(key, len(remote[key].content().encode()), 0)
+            continue
+        item = SnapshotFile(f"file{i}", 1000 + i, 1600000000 + i, 0, f"https://example.com/files/{i}", i)
+        on_disk = SnapshotFile(item.name, item.size, item.modified_at, 0, "", i)
+        r = rng.random()
+        if r < .8:
+            remote[key] = item
+            local[key] = on_disk
+        elif r < .85:
+            remote[key] = item
+            local[key] = SnapshotFile(item.name, item.size + 1, item.modified_at, 0, "", i)
+        elif r < .9:
+            remote[key] = item
+        elif r < .95:
+            local[key] = on_disk
+        else:
+            remote["moved/" + key] = item
+            local[key] = on_disk
+    return remote, local
+
+
+def reference_plan(snapshot_from, snapshot_to, file_filter, remove_local_file):
+    """
+    Plans a transfer the way Planner did before it planned lazily, building the filtered snapshot and the plan
+    list in full
+    """
+    snapshot_from_filter = file_filter.filter_files(snapshot_from)
+    plans = []
+    for key, from_item in snapshot_from.items():
+        if key not in snapshot_from_filter:
+            plans.append(("ignore", key, from_item))
+        elif key not in snapshot_to:
+            plans.append(("add", key, from_item))
+        else:
+            to_item = snapshot_to[key]
+            if isinstance(from_item, SnapshotFile):
+                if to_item.size != from_item.size or to_item.modified_at != from_item.modified_at:
+                    plans.append(("update", key, from_item))
+            if isinstance(from_item, SnapshotLink):
+                if to_item.size != len(from_item.content().encode("utf-8")):
+                    plans.append(("update", key, from_item))
+    removed = [key for key in snapshot_to if key not in snapshot_from_filter]
+
+    by_file_id = {}
+    for key in removed:
+        to_item = snapshot_to[key]
+        if isinstance(to_item, SnapshotFile) and to_item.file_id:
+            by_file_id.setdefault(to_item.file_id, []).append(key)
+    moved = set()
+    op = "move" if remove_local_file else "copy"
+    for idx, (plan_op, key, from_item) in enumerate(plans):
+        if plan_op != "add" or not isinstance(from_item, SnapshotFile) or not from_item.file_id:
+            continue
+        for old_key in by_file_id.get(from_item.file_id, []):
+            to_item = snapshot_to[old_key]
+            if old_key in moved or to_item.size != from_item.size or to_item.modified_at != from_item.modified_at:
+                continue
+            plans[idx] = (op, key, (old_key, from_item))
+            if remove_local_file:
+                moved.add(old_key)
+            break
+
+    for key in removed:
+        if key in moved:
+            continue
+        plans.append(("delete" if remove_local_file else "try-remove", key, snapshot_to[key]))
+    return plans
+
+
+def forget_link_sizes(snapshot):
+    """
+    Drops sizes cached by links, so that every run renders them again
+    """
+    for item in snapshot.values():
+        if isinstance(item, SnapshotLink):
+            item.__dict__.pop("size", None)
+
+
+def measure(plan, remote):
+    """
+    Returns (result, seconds, peak bytes allocated) of a plan function
+    """
+    forget_link_sizes(remote)
+    gc.collect()
+    start = time.perf_counter()
+    result = plan()
+    elapsed = time.perf_counter() - start
+    forget_link_sizes(remote)
+    gc.collect()
+    tracemalloc.start()
+    plan()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(*sizes):
+    failed = False
+    for count in sizes or SIZES:
+        remote, local = synthetic_snapshots(count)
+        for group in (["Document"], ["All"]):
+            file_filter = FileFilter()
+            file_filter.allowed_group = group
+            for remove_local_file in (True, False):
+                expected, t_ref, m_ref = measure(
+                    lambda: reference_plan(remote, local, file_filter, remove_local_file), remote)
+                planner = Planner(remove_local_file)
+                plans, t_plan, m_plan = measure(lambda: planner.plan(remote, local, file_filter), remote)
+                _, t_lazy, m_lazy = measure(
+                    lambda: sum(1 for _ in planner.yield_plan(remote, local, file_filter)), remote)
+                same = plans == expected
+                print(f"{count:>8} {group[0]:8} delete={remove_local_file!s:5} same={same!s:5} "
+                      f"reference {t_ref:.2f}s {m_ref / 2 ** 20:.0f}MiB, "
+                      f"plan {t_plan:.2f}s {m_plan / 2 ** 20:.0f}MiB, "
+                      f"yield_plan {t_lazy:.2f}s {m_lazy / 2 ** 20:.0f}MiB ({len(plans)} entries)")
+                if not same or t_plan > t_ref * TIME_TOLERANCE or m_plan > m_ref:
+                    failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
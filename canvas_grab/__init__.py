@@ -1,11 +1,43 @@
-from . import course_filter
-from . import config
-from . import snapshot
-from . import planner
-from . import transfer
-from . import version
-from . import course_parser
-from . import get_options
-from . import file_conversions
-
-__version__ = version.VERSION
+import importlib
+
+# submodules are imported on first access, so that e.g. listing courses does not
+# pay for the document converters. Every submodule must be listed here to be
+# reachable as an attribute of the package.
+SUBMODULES = [
+    'course_filter',
+    'config',
+    'snapshot',
+    'planner',
+    'transfer',
+    'version',
+    'course_parser',
+    'get_options',
+    'file_conversions',
+    'paginator',
+    'conversion_cache',
+    'conversion_pool',
+    'blob_store',
+    'rate_limiter',
+    'retry',
+    'archive',
+    'utils',
+    'file_filter',
+    'session',
+    'download_file',
+    'request_batcher',
+    'response_cache',
+    'configurable',
+    'error',
+]
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    if name == '__version__':
+        return importlib.import_module('.version', __name__).VERSION
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + SUBMODULES + ['__version__'])
@@ -0,0 +1,223 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from .conversion_cache import file_sha256
+
+INDEX_NAME = '.canvas_grab_archive.sqlite3'
+
+
+@dataclass
+class ArchivedVersion:
+    """A version of a file kept in the archive.
+    """
+    path: str
+    generation: str
+    archived_at: float
+    size: int
+    sha256: str
+    stored_path: str
+
+
+def new_generation():
+    now = time.time_ns()
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10 ** 9)) + f'-{now // 1000 % 10 ** 6:06d}'
+
+
+class Archive(object):
+    """Versioned archive of replaced and deleted files.
+
+    Files replaced or deleted by a transfer are moved into a generation folder named
+    after the time of the transfer, to the microsecond, as ``<generation>/<path>`` inside the archive
+    folder. A version whose content is already archived is stored as a hard link to
+    it, so unchanged content takes space once.
+
+    Versions are indexed in a SQLite database, so listing, comparing and restoring
+    them does not scan the archive. ``prune`` keeps the newest ``keep_versions``
+    versions of each path, then evicts least recently used versions until the archive
+    holds at most ``max_bytes``. Either limit is disabled by setting it to 0.
+    """
+
+    def __init__(self, path, keep_versions=5, max_bytes=1024 * 1024 * 1024, generation=None):
+        """Open an archive
+
+        Args:
+            path (str): folder of the archive
+            keep_versions (int, optional): versions kept per path. Defaults to 5.
+            max_bytes (int, optional): maximum size of archived content. Defaults to 1 GiB.
+            generation (str, optional): generation new versions are stored in. Defaults to a new
+                generation named after the current time.
+        """
+        self.path = path
+        self.keep_versions = keep_versions
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if generation is None:
+            # claim the folder, so that archives opened at the same time never share a generation
+            while True:
+                generation = new_generation()
+                try:
+                    os.mkdir(os.path.join(path, generation))
+                    break
+                except FileExistsError:
+                    continue
+        self.generation = generation
+        self.conn = sqlite3.connect(os.path.join(
+            path, INDEX_NAME), timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS versions (
+                    path TEXT, generation TEXT, archived_at REAL, used_at REAL,
+                    size INTEGER, sha256 TEXT, stored_path TEXT PRIMARY KEY);
+                CREATE INDEX IF NOT EXISTS versions_path ON versions (path, archived_at);
+                CREATE INDEX IF NOT EXISTS versions_sha256 ON versions (sha256);
+            ''')
+
+    def store(self, path):
+        """Move a file into the current generation
+
+        Args:
+            path (str): the file to archive. It is gone afterwards.
+
+        Returns:
+            ArchivedVersion: the archived version, or None if there is no such file
+        """
+        if not os.path.isfile(path):
+            return None
+        stored_path = f'{self.path}/{self.generation}/{path}'
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        if os.path.exists(stored_path):
+            # archived twice in one generation, keep the latest
+            self.forget(stored_path)
+        size = os.path.getsize(path)
+        sha256 = file_sha256(path)
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT stored_path FROM versions WHERE sha256 = ?', (sha256,)).fetchall()
+        for same, in rows:
+            try:
+                if not os.path.samefile(same, path):
+                    os.link(same, stored_path)
+                    os.remove(path)
+                    break
+            except OSError:
+                continue
+        else:
+            os.replace(path, stored_path)
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (path, self.generation, now, now, size, sha256, stored_path))
+        return ArchivedVersion(path, self.generation, now, size, sha256, stored_path)
+
+    def versions(self, path):
+        """List archived versions of a file, newest first
+
+        Args:
+            path (str): path the file had when it was archived
+
+        Returns:
+            [ArchivedVersion]: its versions
+        """
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT path, generation, archived_at, size, sha256, stored_path FROM versions
+                WHERE path = ? ORDER BY archived_at DESC''', (path,)).fetchall()
+        return [ArchivedVersion(*row) for row in rows]
+
+    def restore(self, version, path=None):
+        """Copy an archived version back, archiving the file it replaces
+
+        Args:
+            version (ArchivedVersion): the version to restore
+            path (str, optional): where to restore it. Defaults to its original path.
+        """
+        path = path or version.path
+        self.store(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        shutil.copy2(version.stored_path, path)
+        with self.lock:
+            with self.conn:
+                self.conn.execute('UPDATE versions SET used_at = ? WHERE stored_path = ?',
+                                  (time.time(), version.stored_path))
+
+    def forget(self, stored_path):
+        """Remove a stored version and its index entry"""
+        if os.path.exists(stored_path):
+            os.remove(stored_path)
+            self.remove_empty_parents(stored_path)
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    'DELETE FROM versions WHERE stored_path = ?', (stored_path,))
+
+    def remove_empty_parents(self, stored_path):
+        parent = os.path.dirname(stored_path)
+        root = os.path.abspath(self.path)
+        while os.path.abspath(parent) != root:
+            try:
+                os.rmdir(parent)
+            except OSError:
+                return
+            parent = os.path.dirname(parent)
+
+    def total_bytes(self):
+        """Get the size of archived content, counting content shared by versions once
+        """
+        with self.lock:
+            total, = self.conn.execute('''
+                SELECT COALESCE(SUM(size), 0) FROM (
+                    SELECT MAX(size) AS size FROM versions GROUP BY sha256)''').fetchone()
+        return total
+
+    def prune(self):
+        """Apply the retention policy
+
+        Returns:
+            int: number of versions removed
+        """
+        removed = []
+        with self.lock:
+            if self.keep_versions:
+                removed.extend(stored_path for stored_path, in self.conn.execute('''
+                    SELECT stored_path FROM (
+                        SELECT stored_path, ROW_NUMBER() OVER (
+                            PARTITION BY path ORDER BY archived_at DESC) AS n FROM versions)
+                    WHERE n > ?''', (self.keep_versions,)))
+        for stored_path in removed:
+            self.forget(stored_path)
+        if not self.max_bytes:
+            return len(removed)
+
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return len(removed)
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT stored_path, size, sha256 FROM versions ORDER BY used_at').fetchall()
+        links = {}
+        for _, _, sha256 in rows:
+            links[sha256] = links.get(sha256, 0) + 1
+        for stored_path, size, sha256 in rows:
+            self.forget(stored_path)
+            removed.append(stored_path)
+            links[sha256] -= 1
+            if links[sha256] == 0:
+                # the last version holding this content is gone
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        return len(removed)
+
+    def close(self):
+        try:
+            # nothing was archived in this generation
+            os.rmdir(os.path.join(self.path, self.generation))
+        except OSError:
+            pass
+        with self.lock:
+            self.conn.close()
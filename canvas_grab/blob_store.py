@@ -0,0 +1,192 @@
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .conversion_cache import file_sha256
+
+STORE_NAME = '.canvas_grab_blobs'
+
+
+class BlobStore(object):
+    """Content-addressed store of downloaded files.
+
+    Every downloaded file is stored once as ``objects/<sha256[:2]>/<sha256>`` inside the
+    store folder, and each version of a Canvas file, identified by file ID, modification
+    time and size, is mapped to the hash of its content. Files found in the store are
+    materialized into course folders instead of being downloaded again.
+
+    Files are materialized as hard links when the blob has the same modification time
+    as the file, so that every link keeps the time Canvas reports for it, and copied
+    otherwise or where hard links are not supported. Linked files share their content
+    with the store and must not be modified in place.
+
+    JSON conversions are also kept per blob, so that a file is converted only once
+    however often it appears.
+    """
+
+    def __init__(self, path):
+        """Open a blob store
+
+        Args:
+            path (str): folder of the store, usually ``.canvas_grab_blobs`` in the download folder
+        """
+        self.path = path
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.file_locks = {}
+        self.conn = sqlite3.connect(os.path.join(
+            path, 'index.sqlite3'), check_same_thread=False)
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS versions (
+                    file_id INTEGER, modified_at INTEGER, size INTEGER, sha256 TEXT,
+                    PRIMARY KEY (file_id, modified_at, size));
+                CREATE TABLE IF NOT EXISTS conversions (
+                    sha256 TEXT, extension TEXT, output TEXT,
+                    PRIMARY KEY (sha256, extension));
+            ''')
+
+    def blob_path(self, sha256):
+        return os.path.join(self.path, 'objects', sha256[:2], sha256)
+
+    @contextmanager
+    def file_lock(self, file_id):
+        """Serialize work on a Canvas file, e.g. when it is linked from several modules
+        """
+        with self.lock:
+            lock = self.file_locks.setdefault(file_id, threading.Lock())
+        with lock:
+            yield
+
+    def lookup(self, snapshot_file):
+        """Find the blob holding a version of a Canvas file
+
+        Args:
+            snapshot_file (canvas_grab.snapshot.SnapshotFile): the file on Canvas
+
+        Returns:
+            str: hash of the blob, or None if it is not in the store
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT sha256 FROM versions WHERE file_id = ? AND modified_at = ? AND size = ?', (
+                snapshot_file.file_id, snapshot_file.modified_at, snapshot_file.size)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return row[0]
+
+    def materialize(self, sha256, path, modified_at):
+        """Write the content of a blob to ``path``, replacing any file there
+
+        Args:
+            sha256 (str): hash of the blob
+            path (str): where to write it
+            modified_at (int): modification time the file should have
+        """
+        blob = self.blob_path(sha256)
+        tmp_path = path + '.canvas_tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            if int(os.stat(blob).st_mtime) != modified_at:
+                raise OSError('modification time differs')
+            os.link(blob, tmp_path)
+        except OSError:
+            shutil.copyfile(blob, tmp_path)
+        os.replace(tmp_path, path)
+
+    def ingest(self, path, snapshot_file):
+        """Add a downloaded file to the store
+
+        If the store already has its content with the same modification time, the file
+        is replaced by a link to it where possible. Otherwise the file becomes the blob.
+
+        Args:
+            path (str): the downloaded file, with its final modification time applied
+            snapshot_file (canvas_grab.snapshot.SnapshotFile): the file on Canvas
+
+        Returns:
+            str: hash of the blob
+        """
+        sha256 = file_sha256(path)
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, path) and int(os.stat(blob).st_mtime) == snapshot_file.modified_at:
+                tmp_path = path + '.canvas_tmp'
+                try:
+                    os.link(blob, tmp_path)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    # keep the downloaded copy
+                    pass
+        else:
+            tmp_blob = f'{blob}.{threading.get_ident()}.tmp'
+            if os.path.exists(tmp_blob):
+                os.remove(tmp_blob)
+            try:
+                os.link(path, tmp_blob)
+            except OSError:
+                shutil.copy2(path, tmp_blob)
+            os.replace(tmp_blob, blob)
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?)', (
+                    snapshot_file.file_id, snapshot_file.modified_at, snapshot_file.size, sha256))
+        return sha256
+
+    def get_conversion(self, sha256, extension):
+        """Get the JSON conversion of some content
+
+        Args:
+            sha256 (str): hash of the content
+            extension (str): extension of the file, which decides how it is converted
+
+        Returns:
+            str: the JSON, or None if it was not converted yet
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT output FROM conversions WHERE sha256 = ? AND extension = ?',
+                                    (sha256, extension)).fetchone()
+        return None if row is None else row[0]
+
+    def put_conversion(self, sha256, extension, output):
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO conversions VALUES (?, ?, ?)',
+                                  (sha256, extension, output))
+
+    def collect_garbage(self):
+        """Remove blobs no longer linked from any folder, and versions and conversions of
+        content not in the store
+
+        A blob is unused when the store holds its only link. Blobs which had to be
+        copied instead of linked look the same, and are removed as well.
+
+        Returns:
+            int: number of blobs removed
+        """
+        removed = 0
+        kept = set()
+        objects = os.path.join(self.path, 'objects')
+        for prefix in os.listdir(objects):
+            for entry in os.scandir(os.path.join(objects, prefix)):
+                if entry.name.endswith('.tmp'):
+                    continue
+                if entry.stat().st_nlink > 1:
+                    kept.add(entry.name)
+                    continue
+                os.remove(entry.path)
+                removed += 1
+        with self.lock:
+            with self.conn:
+                for table in ['versions', 'conversions']:
+                    stale = [(sha256,) for sha256, in self.conn.execute(f'SELECT DISTINCT sha256 FROM {table}')
+                             if sha256 not in kept]
+                    self.conn.executemany(
+                        f'DELETE FROM {table} WHERE sha256 = ?', stale)
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
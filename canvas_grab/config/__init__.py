@@ -5,6 +5,8 @@ from termcolor import colored
 
 from .endpoint import Endpoint
 from .organize_mode import OrganizeMode
+from .transfer_options import TransferOptions
+from .conversion_options import ConversionOptions
 from ..course_filter import CourseFilter
 from ..file_filter import FileFilter
 from ..utils import filter_available_courses
@@ -20,6 +22,8 @@ class Config(Configurable, Interactable):
         self.organize_mode = OrganizeMode()
         self.download_folder = 'files'
         self.file_filter = FileFilter()
+        self.transfer = TransferOptions()
+        self.conversion = ConversionOptions()
 
     def to_config(self):
         return {
@@ -27,7 +31,9 @@ class Config(Configurable, Interactable):
             'course_filter': self.course_filter.to_config(),
             'organize_mode': self.organize_mode.to_config(),
             'download_folder': self.download_folder,
-            'file_filter': self.file_filter.to_config()
+            'file_filter': self.file_filter.to_config(),
+            'transfer': self.transfer.to_config(),
+            'conversion': self.conversion.to_config()
         }
 
     def try_from_config(self, func):
@@ -56,6 +62,12 @@ class Config(Configurable, Interactable):
         _, err = self.try_from_config(
             lambda: self.file_filter.from_config(config['file_filter']))
         final_err = final_err or err
+        _, err = self.try_from_config(
+            lambda: self.transfer.from_config(config.get('transfer', {})))
+        final_err = final_err or err
+        _, err = self.try_from_config(
+            lambda: self.conversion.from_config(config.get('conversion', {})))
+        final_err = final_err or err
         if final_err:
             raise final_err
 
@@ -0,0 +1,48 @@
+from ..configurable import Configurable
+from ..conversion_pool import ConversionPool
+
+
+class ConversionOptions(Configurable):
+    """ConversionOptions decides how downloaded documents are converted to JSON.
+
+    ``workers`` is the number of conversion processes, 0 for one per available core.
+    Each file may take up to ``timeout`` seconds, and each worker up to ``max_rss_mb``
+    MiB of memory. Workers are restarted after ``max_tasks_per_worker`` files.
+    Pages of large PDFs are extracted by up to ``pdf_workers`` processes per worker,
+    as long as the workers together do not use more processes than available cores:
+    a PDF gets at most the available cores divided by the workers running when its
+    conversion starts. With the default ``workers`` of one per core, extraction only
+    runs in parallel while fewer files than cores are left to convert, so lower
+    ``workers`` to always split large PDFs.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.timeout = 300
+        self.max_rss_mb = 2048
+        self.max_tasks_per_worker = 50
+        self.pdf_workers = 1
+
+    def get_pool(self):
+        """Create a conversion pool
+        """
+        return ConversionPool(self.workers or None, self.timeout,
+                              self.max_rss_mb * 1024 * 1024, self.max_tasks_per_worker,
+                              self.pdf_workers)
+
+    def to_config(self):
+        return {
+            'workers': self.workers,
+            'timeout': self.timeout,
+            'max_rss_mb': self.max_rss_mb,
+            'max_tasks_per_worker': self.max_tasks_per_worker,
+            'pdf_workers': self.pdf_workers
+        }
+
+    def from_config(self, config):
+        self.workers = config.get('workers', self.workers)
+        self.timeout = config.get('timeout', self.timeout)
+        self.max_rss_mb = config.get('max_rss_mb', self.max_rss_mb)
+        self.max_tasks_per_worker = config.get(
+            'max_tasks_per_worker', self.max_tasks_per_worker)
+        self.pdf_workers = config.get('pdf_workers', self.pdf_workers)
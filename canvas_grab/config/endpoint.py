@@ -1,31 +1,80 @@
 from ..configurable import Configurable, Interactable
 from canvasapi import Canvas
-import questionary
+from ..session import get_session, DEFAULT_POOL_SIZE
+from ..response_cache import ResponseCache, mount_response_cache
+from ..rate_limiter import RateLimiter, mount_rate_limiter
 
 
 class Endpoint(Configurable, Interactable):
     """Endpoint stores Canvas LMS endpoint and API key.
+
+    ``pool_size`` is the number of keep-alive connections per host in the HTTP session
+    shared by API calls and downloads. API responses cached on disk expire after
+    ``cache_ttl`` seconds, and the cache is kept under ``cache_max_bytes``. If
+    ``rate_limit`` is set, requests to Canvas, API calls and file downloads alike, share
+    a ``RateLimiter`` allowing up to ``max_in_flight`` requests at the same time.
     """
 
     def __init__(self):
         self.endpoint = 'https://oc.sjtu.edu.cn'
         self.api_key = ''
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.cache_ttl = 7 * 24 * 3600
+        self.cache_max_bytes = 64 * 1024 * 1024
+        self.rate_limit = True
+        self.max_in_flight = DEFAULT_POOL_SIZE
+        self.rate_limiter = None
 
     def to_config(self):
         return {
             'endpoint': self.endpoint,
-            'api_key': self.api_key
+            'api_key': self.api_key,
+            'pool_size': self.pool_size,
+            'cache_ttl': self.cache_ttl,
+            'cache_max_bytes': self.cache_max_bytes,
+            'rate_limit': self.rate_limit,
+            'max_in_flight': self.max_in_flight
         }
 
     def from_config(self, config):
         self.endpoint = config['endpoint']
         self.api_key = config['api_key']
+        self.pool_size = config.get('pool_size', self.pool_size)
+        self.cache_ttl = config.get('cache_ttl', self.cache_ttl)
+        self.cache_max_bytes = config.get(
+            'cache_max_bytes', self.cache_max_bytes)
+        self.rate_limit = config.get('rate_limit', self.rate_limit)
+        self.max_in_flight = config.get('max_in_flight', self.max_in_flight)
 
     def interact(self):
+        import questionary
         self.endpoint = questionary.text(
             'Canvas API endpoint', default=self.endpoint).unsafe_ask()
         self.api_key = questionary.text(
             'API Key', default=self.api_key, instruction="Please visit profile page of Canvas LMS to generate an access token").unsafe_ask()
 
-    def login(self):
-        return Canvas(self.endpoint, self.api_key)
+    def login(self, cache_path=None):
+        """Create a Canvas client using the shared HTTP session
+
+        Args:
+            cache_path (str, optional): If set, API responses are cached in a SQLite database
+                at this path and revalidated with conditional requests. Defaults to None.
+
+        Returns:
+            canvasapi.Canvas: the Canvas client
+        """
+        canvas = Canvas(self.endpoint, self.api_key)
+        requester = canvas._Canvas__requester
+        session = get_session(self.pool_size)
+        if self.rate_limit:
+            self.rate_limiter = RateLimiter(self.max_in_flight)
+            mount_rate_limiter(session, self.endpoint.rstrip('/') + '/',
+                               self.rate_limiter, self.pool_size)
+        if cache_path is not None:
+            cache = ResponseCache(
+                cache_path, self.cache_ttl, self.cache_max_bytes)
+            mount_response_cache(
+                session, requester.base_url, cache, self.pool_size, self.rate_limiter)
+        # canvasapi creates a private session per requester, share ours instead
+        requester._session = session
+        return canvas
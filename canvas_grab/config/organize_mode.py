@@ -1,4 +1,3 @@
-import questionary
 from ..configurable import Configurable, Interactable
 from ..utils import find_choice
 from ..snapshot import CanvasFileSnapshot, CanvasModuleSnapshot
@@ -16,18 +15,18 @@ class OrganizeMode(Configurable, Interactable):
         self.mode = 'module'
         self.delete_file = False
 
-    def get_snapshots(self, course):
-        if self.mode == 'module_link':
-            canvas_snapshot_module = CanvasModuleSnapshot(
-                course, True)
-        else:
-            canvas_snapshot_module = CanvasModuleSnapshot(
-                course)
+    def get_snapshots(self, course, file_filter=None):
+        """Create snapshot-takers of a course, the one of the selected mode first
 
-        if self.mode == 'file_link':
-            canvas_snapshot_file = CanvasFileSnapshot(course, True)
-        else:
-            canvas_snapshot_file = CanvasFileSnapshot(course)
+        Args:
+            course (canvasapi.course.Course): The course object
+            file_filter (canvas_grab.file_filter.FileFilter, optional): pushed down into
+                snapshot-takers, so that excluded files are not requested. Defaults to None.
+        """
+        canvas_snapshot_module = CanvasModuleSnapshot(
+            course, self.mode == 'module_link', file_filter)
+        canvas_snapshot_file = CanvasFileSnapshot(
+            course, self.mode == 'file_link', file_filter)
 
         if self.mode == 'module' or self.mode == 'module_link':
             canvas_snapshots = [canvas_snapshot_module, canvas_snapshot_file]
@@ -49,6 +48,7 @@ class OrganizeMode(Configurable, Interactable):
         self.delete_file = config['delete_file']
 
     def interact(self):
+        import questionary
         choices = [
             questionary.Choice(
                 'Organize by module, only download files', 'module'),
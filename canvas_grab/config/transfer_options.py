@@ -0,0 +1,86 @@
+from ..configurable import Configurable
+import os
+from ..transfer import Transfer
+from ..retry import RetryBudget, RetryPolicy
+from ..blob_store import BlobStore, STORE_NAME
+
+
+class TransferOptions(Configurable):
+    """TransferOptions decides how files are transferred from Canvas.
+
+    ``max_workers`` is the number of files downloaded at the same time. Files
+    larger than ``segment_threshold`` bytes are split into ``segments`` byte
+    ranges downloaded in parallel. Set ``segments`` to 1 to disable it.
+    If ``dedup`` is set, files are kept once in a ``BlobStore`` in the download
+    folder and linked into course folders.
+    Downloads time out after ``timeout`` seconds without data. A failed download
+    is tried up to ``retry_attempts`` times, waiting up to ``retry_max_delay``
+    seconds between attempts, while the ``retry_budget`` retries shared by all
+    downloads of a sync last. The archive of replaced and deleted files keeps
+    ``archive_keep_versions`` versions per file and at most ``archive_max_bytes``
+    of content. Set either to 0 for no limit.
+    """
+
+    def __init__(self):
+        self.max_workers = 4
+        self.segments = 4
+        self.segment_threshold = 32 * 1024 * 1024
+        self.dedup = True
+        self.timeout = 60
+        self.retry_attempts = 5
+        self.retry_max_delay = 60
+        self.retry_budget = 100
+        self.archive_keep_versions = 5
+        self.archive_max_bytes = 1024 * 1024 * 1024
+
+    def get_blob_store(self, download_folder):
+        """Open the blob store of a download folder
+
+        Returns:
+            BlobStore: the store, or None if ``dedup`` is disabled
+        """
+        if not self.dedup:
+            return None
+        return BlobStore(os.path.join(download_folder, STORE_NAME))
+
+    def get_retry_budget(self):
+        """Create the budget of retries shared by all downloads of a sync
+        """
+        return RetryBudget(self.retry_budget)
+
+    def get_transfer(self, blob_store=None, retry_budget=None):
+        retry_policy = RetryPolicy(
+            self.retry_attempts, max_delay=self.retry_max_delay, budget=retry_budget)
+        return Transfer(self.max_workers, segments=self.segments, segment_threshold=self.segment_threshold,
+                        blob_store=blob_store, timeout=(10, self.timeout), retry_policy=retry_policy,
+                        keep_versions=self.archive_keep_versions, archive_max_bytes=self.archive_max_bytes)
+
+    def to_config(self):
+        return {
+            'max_workers': self.max_workers,
+            'segments': self.segments,
+            'segment_threshold': self.segment_threshold,
+            'dedup': self.dedup,
+            'timeout': self.timeout,
+            'retry_attempts': self.retry_attempts,
+            'retry_max_delay': self.retry_max_delay,
+            'retry_budget': self.retry_budget,
+            'archive_keep_versions': self.archive_keep_versions,
+            'archive_max_bytes': self.archive_max_bytes
+        }
+
+    def from_config(self, config):
+        self.max_workers = config.get('max_workers', self.max_workers)
+        self.segments = config.get('segments', self.segments)
+        self.segment_threshold = config.get(
+            'segment_threshold', self.segment_threshold)
+        self.dedup = config.get('dedup', self.dedup)
+        self.timeout = config.get('timeout', self.timeout)
+        self.retry_attempts = config.get('retry_attempts', self.retry_attempts)
+        self.retry_max_delay = config.get(
+            'retry_max_delay', self.retry_max_delay)
+        self.retry_budget = config.get('retry_budget', self.retry_budget)
+        self.archive_keep_versions = config.get(
+            'archive_keep_versions', self.archive_keep_versions)
+        self.archive_max_bytes = config.get(
+            'archive_max_bytes', self.archive_max_bytes)
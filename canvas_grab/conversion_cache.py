@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+CACHE_NAME = '.canvas_grab_conversions.sqlite3'
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ConversionCache(object):
+    """Remembers which source files have been converted to JSON.
+
+    Each source is recorded with its size, modification time and content hash, and the
+    path of its JSON output (None if it could not be converted). A source is only
+    converted again if it changed. If size or modification time changed but the
+    content hash is the same, the recorded stat is refreshed instead.
+    """
+
+    def __init__(self, base_path):
+        """Open the conversion cache of a course folder
+
+        Args:
+            base_path (str): course folder. The cache is stored as ``.canvas_grab_conversions.sqlite3`` in it.
+        """
+        self.base_path = base_path
+        self.lock = threading.Lock()
+        os.makedirs(base_path, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(
+            base_path, CACHE_NAME), check_same_thread=False)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversions (
+                    source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                    sha256 TEXT, output TEXT)''')
+
+    def is_fresh(self, source):
+        """Check whether a source is unchanged since its last conversion
+
+        Args:
+            source (str): path of the source file
+
+        Returns:
+            bool: True if the recorded conversion can be reused
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT size, mtime_ns, sha256, output FROM conversions WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return False
+        size, mtime_ns, sha256, output = row
+        if output is not None and not os.path.exists(output):
+            return False
+        stat = os.stat(source)
+        if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+            return True
+        if stat.st_size != size or file_sha256(source) != sha256:
+            return False
+        with self.lock:
+            with self.conn:
+                self.conn.execute('UPDATE conversions SET mtime_ns = ? WHERE source = ?',
+                                  (stat.st_mtime_ns, source))
+        return True
+
+    def record(self, source, output):
+        """Record a conversion
+
+        Args:
+            source (str): path of the source file
+            output (str): path of the JSON output, or None if conversion failed
+        """
+        stat = os.stat(source)
+        sha256 = file_sha256(source)
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?, ?)',
+                                  (source, stat.st_size, stat.st_mtime_ns, sha256, output))
+
+    def remove_missing(self, sources):
+        """Forget sources which no longer exist, and delete their outputs
+
+        Args:
+            sources (set): paths of all current source files
+
+        Returns:
+            list: deleted outputs
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT source, output FROM conversions').fetchall()
+        removed = [(source, output)
+                   for source, output in rows if source not in sources]
+        live_outputs = {output for source, output in rows if source in sources}
+        deleted = []
+        for source, output in removed:
+            if output is not None and output not in live_outputs and os.path.exists(output):
+                os.remove(output)
+                deleted.append(output)
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('DELETE FROM conversions WHERE source = ?',
+                                      [(source,) for source, _ in removed])
+        return deleted
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
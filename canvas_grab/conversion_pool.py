@@ -0,0 +1,253 @@
+import os
+import signal
+import sys
+import threading
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def current_rss(pid):
+    """Get resident memory of a process in bytes, or None if it cannot be read
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def child_pids(pid):
+    """Get IDs of the child processes of a process, empty if they cannot be read
+    """
+    pids = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return pids
+
+
+def tree_rss(pid):
+    """Get resident memory of a process and all of its descendants in bytes, or None if it cannot be read
+    """
+    rss = current_rss(pid)
+    if rss is None:
+        return None
+    for child in child_pids(pid):
+        rss += tree_rss(child) or 0
+    return rss
+
+
+def peak_rss():
+    """Get peak resident memory of this process in bytes, or 0 if unknown
+    """
+    if resource is None:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def worker_main(conn):
+    if hasattr(os, 'setpgrp'):
+        # lead a process group, so that processes extracting PDF pages are killed along with the worker
+        os.setpgrp()
+    from .file_conversions import convert_file_to_json
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        path, options = task
+        try:
+            result = (convert_file_to_json(path, **options), None)
+        except Exception as e:
+            result = (None, f'{type(e).__name__}: {e}')
+        conn.send(result + (peak_rss(),))
+
+
+class Worker(object):
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        # not a daemon, as daemons may not start processes
+        self.process = context.Process(
+            target=worker_main, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        self.path = None
+        self.started = None
+        self.tasks = 0
+
+    def submit(self, path, options):
+        self.conn.send((path, options))
+        self.path = path
+        self.started = time.monotonic()
+        self.tasks += 1
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                # the worker may not have led its group yet
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ConversionPool(object):
+    """Converts files to JSON in worker processes.
+
+    Each conversion runs in a worker process, and large PDFs are split over up to
+    ``pdf_workers`` further processes. A conversion only gets the cores left to it
+    when it starts, available cores divided by running workers, so page extraction
+    runs in parallel when there are fewer files to convert than ``workers``. A conversion running longer than ``timeout``
+    seconds, or whose worker and its processes grow over ``max_rss`` bytes, is killed
+    along with them and reported as failed. Workers are replaced after
+    ``max_tasks_per_worker`` conversions, or once their peak memory exceeds ``max_rss``.
+
+    A pool may be shared by threads converting at the same time, e.g. one per course.
+    Their workers together never exceed ``workers``. Workers are started with
+    ``forkserver`` where available and ``spawn`` otherwise, as forking a process which
+    runs threads may copy locks held by them.
+    """
+
+    def __init__(self, workers=None, timeout=300, max_rss=2 * 1024 * 1024 * 1024, max_tasks_per_worker=50,
+                 pdf_workers=1):
+        """Create a conversion pool
+
+        Args:
+            workers (int, optional): number of worker processes. Defaults to the number of available cores.
+            timeout (int, optional): maximum seconds per file. Defaults to 300.
+            max_rss (int, optional): maximum resident memory per worker in bytes. Defaults to 2 GiB.
+            max_tasks_per_worker (int, optional): conversions before a worker is recycled. Defaults to 50.
+            pdf_workers (int, optional): processes extracting pages of one PDF, at most the available
+                cores per running worker. Defaults to 1.
+        """
+        self.workers = workers or available_cores()
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.pdf_workers = pdf_workers
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.context = multiprocessing.get_context(start_method)
+        # worker processes left to start, shared by all conversions
+        self.slots = threading.BoundedSemaphore(self.workers)
+        self.lock = threading.Lock()
+        self.running = 0
+
+    def start_worker(self, wait):
+        """Start a worker if the pool has room
+
+        Args:
+            wait (bool): whether to wait up to half a second for another conversion to free a worker
+
+        Returns:
+            Worker: the worker, or None if the pool is full
+        """
+        if not self.slots.acquire(timeout=0.5 if wait else 0):
+            return None
+        try:
+            worker = Worker(self.context)
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.running += 1
+        return worker
+
+    def retire(self, worker, kill=False):
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        with self.lock:
+            self.running -= 1
+        self.slots.release()
+
+    def task_options(self):
+        """Get options of a conversion starting now
+
+        Workers and their page extraction processes stay within the available cores.
+        """
+        with self.lock:
+            running = max(1, self.running)
+        return {'pdf_workers': max(1, min(self.pdf_workers, available_cores() // running))}
+
+    def convert(self, paths):
+        """Convert files
+
+        Args:
+            paths ([str]): paths of files to convert
+
+        Yields:
+            (path, json_version, error) tuples in completion order. ``json_version`` is None
+            if the file is not supported or failed, in which case ``error`` may describe why.
+        """
+        pending = list(reversed(paths))
+        idle = []
+        busy = {}
+        try:
+            while pending or busy:
+                while len(idle) < len(pending) and len(idle) + len(busy) < self.workers:
+                    worker = self.start_worker(wait=not idle and not busy)
+                    if worker is None:
+                        break
+                    idle.append(worker)
+                while pending and idle:
+                    worker = idle.pop()
+                    worker.submit(pending.pop(), self.task_options())
+                    busy[worker.conn] = worker
+
+                for conn in wait(list(busy), timeout=0.5):
+                    worker = busy.pop(conn)
+                    try:
+                        json_version, error, rss = conn.recv()
+                    except EOFError:
+                        self.retire(worker, kill=True)
+                        yield (worker.path, None, f'worker exited with code {worker.process.exitcode}')
+                        continue
+                    yield (worker.path, json_version, error)
+                    if worker.tasks >= self.max_tasks_per_worker or rss > self.max_rss:
+                        self.retire(worker)
+                    else:
+                        idle.append(worker)
+
+                now = time.monotonic()
+                for conn, worker in list(busy.items()):
+                    if now - worker.started > self.timeout:
+                        error = f'timed out after {self.timeout}s'
+                    elif (tree_rss(worker.process.pid) or 0) > self.max_rss:
+                        error = f'exceeded memory limit of {self.max_rss // (1024 * 1024)} MiB'
+                    else:
+                        continue
+                    del busy[conn]
+                    self.retire(worker, kill=True)
+                    yield (worker.path, None, error)
+        finally:
+            for worker in idle + list(busy.values()):
+                self.retire(worker)
@@ -3,7 +3,6 @@ from .term_filter import TermFilter
 from .base_filter import BaseFilter
 from .per_filter import PerFilter
 from ..configurable import Configurable, Interactable
-import questionary
 
 
 def get_name(course_filter):
@@ -53,6 +52,7 @@ class CourseFilter(Configurable, Interactable):
         self.per_filter.from_config(config['per_filter'])
 
     def interact(self, courses):
+        import questionary
         choices = [
             questionary.Choice('All courses', 'all'),
             questionary.Choice('Filter by term', 'term'),
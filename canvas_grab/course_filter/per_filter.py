@@ -1,4 +1,3 @@
-import questionary
 from .base_filter import BaseFilter
 from ..utils import group_by, summarize_courses
 
@@ -25,6 +24,7 @@ class PerFilter(BaseFilter):
         self.course_id = config['course_id']
 
     def interact(self, courses):
+        import questionary
         choices = []
         sorted_courses = sorted(
             courses, key=lambda course: course.enrollment_term_id)
@@ -1,4 +1,3 @@
-import questionary
 from .base_filter import BaseFilter
 from ..utils import group_by, summarize_courses
 
@@ -31,6 +30,7 @@ class TermFilter(BaseFilter):
         self.terms = config['terms']
 
     def interact(self, courses):
+        import questionary
         groups = group_by(courses, lambda course: course.enrollment_term_id)
         choices = []
         for (term, courses) in groups.items():
@@ -1,42 +1,186 @@
 import os.path
 import sys
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
 from tqdm import tqdm
 from .utils import is_windows
+from .session import get_session
+from .retry import IncompleteDownload
+
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
 
 
 def current_milli_time():
     return round(time.time() * 1000)
 
 
-def download_file(url, desc, filename, file_size, verbose=False, req_timeout=(5, None)):
-    with requests.get(url, stream=True, timeout=req_timeout) as r:
+def chunk_size_for(file_size):
+    """Pick a read size for a download, about 1/64 of the file
+
+    Args:
+        file_size (int): size of the file in bytes
+
+    Returns:
+        int: a power of two between MIN_CHUNK_SIZE and MAX_CHUNK_SIZE
+    """
+    chunk_size = MIN_CHUNK_SIZE
+    while chunk_size < MAX_CHUNK_SIZE and chunk_size * 64 < file_size:
+        chunk_size *= 2
+    return chunk_size
+
+
+def resumable_size(tmp_filename, file_size, modified_at=None):
+    """Get the number of bytes which can be reused from a partial download
+
+    Args:
+        tmp_filename (str): path of the partial download
+        file_size (int): expected size of the complete file
+        modified_at (int, optional): modification time of the remote file. If the partial
+            download was last written before it, the remote file has changed since. Defaults to None.
+
+    Returns:
+        int: bytes to resume from, or 0 if the download must start over
+    """
+    try:
+        stat = os.stat(tmp_filename)
+    except FileNotFoundError:
+        return 0
+    if stat.st_size >= file_size:
+        return 0
+    if modified_at is not None and stat.st_mtime < modified_at:
+        return 0
+    return stat.st_size
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def download_file(url, desc, filename, file_size, verbose=False, req_timeout=(5, None), session=None, modified_at=None,
+                  segments=1, segment_threshold=None, segment_progress=None):
+    session = session or get_session()
+    if segments > 1 and segment_threshold is not None and file_size >= segment_threshold:
+        yield from download_file_segmented(url, desc, filename, file_size, segments, verbose, req_timeout, session,
+                                           segment_progress)
+        return
+    tmp_filename = filename + '.canvas_tmp'
+    resume_from = resumable_size(tmp_filename, file_size, modified_at)
+    headers = {'Range': f'bytes={resume_from}-'} if resume_from else None
+    with session.get(url, stream=True, timeout=req_timeout, headers=headers) as r:
         r.raise_for_status()
-        chunk_size = 1024
+        if resume_from and r.status_code != 206:
+            # server ignored the range, start over
+            resume_from = 0
+        if resume_from and not r.headers.get('Content-Range', '').startswith(f'bytes {resume_from}-'):
+            os.remove(tmp_filename)
+            raise IncompleteDownload(
+                f"Unexpected range {r.headers.get('Content-Range')}, expected bytes {resume_from}-")
+        chunk_size = chunk_size_for(file_size - resume_from)
         if verbose:
-            print("size = %d, url = %s" % (file_size, url))
-        download_size = 0
+            print("size = %d, url = %s, resume from %d" % (file_size, url, resume_from))
+        download_size = resume_from
 
-        with open(filename + '.canvas_tmp', 'wb') as fp:
+        with open(tmp_filename, 'ab' if resume_from else 'wb') as fp:
             with tqdm(
-                total=file_size, unit='B',
+                total=file_size, initial=resume_from, unit='B',
                 unit_scale=True,
                 unit_divisor=1024,
                 desc=desc, bar_format='{l_bar}{bar}{r_bar}', ascii=is_windows(),
                 leave=False
             ) as pbar:
+                # progress is reported at most every 100ms
                 lst_update = current_milli_time()
+                lst_size = download_size
                 for chunk in r.iter_content(chunk_size=chunk_size):
                     fp.write(chunk)
                     download_size += len(chunk)
                     current_time = current_milli_time()
                     if current_time - lst_update > 100:
+                        pbar.update(download_size - lst_size)
                         yield float(download_size) / file_size
                         lst_update = current_time
-                    pbar.update(len(chunk))
+                        lst_size = download_size
+                pbar.update(download_size - lst_size)
         if download_size != file_size:
-            raise Exception(
+            raise IncompleteDownload(
                 f"Incomplete file: expected {file_size}, downloaded {download_size}")
-        os.replace(filename + '.canvas_tmp', filename)
+        os.replace(tmp_filename, filename)
     return
+
+
+def download_file_segmented(url, desc, filename, file_size, segments, verbose=False, req_timeout=(5, None), session=None,
+                            downloaded=None):
+    """Download a file in ``segments`` byte ranges at the same time.
+
+    Segments are written into a preallocated ``.canvas_tmp`` file. If the server
+    does not support range requests, the file is downloaded in one stream instead.
+    Bytes received per segment are counted in ``downloaded``. Passing the list of a
+    failed attempt again resumes every segment where it stopped.
+    """
+    session = session or get_session()
+    tmp_filename = filename + '.canvas_tmp'
+    if downloaded is None:
+        downloaded = []
+    if verbose:
+        print("size = %d, url = %s, %d segments" % (file_size, url, segments))
+    if len(downloaded) != segments or not os.path.isfile(tmp_filename) or os.path.getsize(tmp_filename) != file_size:
+        downloaded[:] = [0] * segments
+        with open(tmp_filename, 'wb') as fp:
+            fp.truncate(file_size)
+
+    bounds = [(i * file_size // segments, (i + 1) * file_size // segments - 1)
+              for i in range(segments)]
+    chunk_size = chunk_size_for(file_size // segments)
+
+    def download_segment(idx):
+        start, end = bounds[idx]
+        start += downloaded[idx]
+        if start > end:
+            return
+        headers = {'Range': f'bytes={start}-{end}'}
+        with session.get(url, stream=True, timeout=req_timeout, headers=headers) as r:
+            r.raise_for_status()
+            if r.status_code != 206 or not r.headers.get('Content-Range', '').startswith(f'bytes {start}-{end}/'):
+                raise RangeNotSupported()
+            with open(tmp_filename, 'r+b') as fp:
+                fp.seek(start)
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if downloaded[idx] + len(chunk) > end - bounds[idx][0] + 1:
+                        raise Exception(
+                            f"Segment overflow: expected {end - bounds[idx][0] + 1} bytes from {bounds[idx][0]}")
+                    fp.write(chunk)
+                    downloaded[idx] += len(chunk)
+
+    try:
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [executor.submit(download_segment, idx)
+                       for idx in range(segments)]
+            with tqdm(
+                total=file_size, initial=sum(downloaded), unit='B',
+                unit_scale=True,
+                unit_divisor=1024,
+                desc=desc, bar_format='{l_bar}{bar}{r_bar}', ascii=is_windows(),
+                leave=False
+            ) as pbar:
+                while True:
+                    _, not_done = wait(futures, timeout=0.1)
+                    download_size = sum(downloaded)
+                    pbar.update(download_size - pbar.n)
+                    if not not_done:
+                        break
+                    yield float(download_size) / file_size
+            for future in futures:
+                future.result()
+    except RangeNotSupported:
+        if verbose:
+            print("range not supported, url = %s" % url)
+        yield from download_file(url, desc, filename, file_size, verbose, req_timeout, session)
+        return
+
+    download_size = sum(downloaded)
+    if download_size != file_size or os.path.getsize(tmp_filename) != file_size:
+        raise IncompleteDownload(
+            f"Incomplete file: expected {file_size}, downloaded {download_size}")
+    os.replace(tmp_filename, filename)
@@ -1,13 +1,16 @@
-import pypdfium2 as pdfium
 import json
-from bs4 import BeautifulSoup
 from termcolor import colored
-from docx import Document
-from pptx import Presentation
 
-def convert_file_to_json(path):
+# The document libraries are imported by the converters using them, as they are
+# slow to import and only needed by conversion workers
+
+# Pages extracted by one process at a time, when extracting a PDF with several processes
+PAGES_PER_RANGE = 25
+
+
+def convert_file_to_json(path, pdf_workers=1):
     if path.endswith('.pdf'):
-        return pdf_to_json(path)
+        return pdf_to_json(path, pdf_workers)
     elif path.endswith('.html'):
         return html_to_json(path)
     elif path.endswith('.docx'):
@@ -19,14 +22,61 @@ def convert_file_to_json(path):
         print(colored(f'  Unsupported file type: {path}', 'yellow'))
         return None 
 
-def pdf_to_json(path):
+
+def extract_pages(path, start, stop):
+    """Extract text of pages ``start`` to ``stop`` (exclusive) of a PDF
+
+    Each call opens its own document, so ranges can be extracted in separate processes.
+    """
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(path)
+    texts = []
+    try:
+        for i in range(start, stop):
+            page = pdf[i]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    texts.append(textpage.get_text_bounded())
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+    return texts
+
+
+def pdf_to_json(path, workers=1):
+    """Convert a PDF to JSON, one entry per page
+
+    PDFs with more than PAGES_PER_RANGE pages are split into ranges of that many pages,
+    extracted by up to ``workers`` processes.
+    """
+    import pypdfium2 as pdfium
     pdf = pdfium.PdfDocument(path)
+    page_count = len(pdf)
+    pdf.close()
+
+    if workers > 1 and page_count > PAGES_PER_RANGE:
+        from concurrent.futures import ProcessPoolExecutor
+        starts = range(0, page_count, PAGES_PER_RANGE)
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+            texts = []
+            for range_texts in executor.map(
+                    extract_pages, [path] * len(starts), starts,
+                    [min(start + PAGES_PER_RANGE, page_count) for start in starts]):
+                texts.extend(range_texts)
+    else:
+        texts = extract_pages(path, 0, page_count)
+
     document = {"document_name": path.split('/')[-1], "content": []}
-    for i, page in enumerate(pdf, start=1):
-        document["content"].append({"page_number": i, "text": page.get_textpage().get_text_bounded()})
+    for i, text in enumerate(texts, start=1):
+        document["content"].append({"page_number": i, "text": text})
     return json.dumps(document, indent=4)
 
 def html_to_json(path):
+    from bs4 import BeautifulSoup
     with open(path, 'r', encoding='utf-8') as file:
         html_content = file.read()
     
@@ -50,6 +100,7 @@ def html_to_json(path):
     return json.dumps(document, indent=4)
 
 def docx_to_json(path):
+    from docx import Document
     # Load the .docx file
     doc = Document(path)
     document = {"document_name": path.split('/')[-1], "content": []}
@@ -63,6 +114,7 @@ def docx_to_json(path):
     return json.dumps(document, indent=4)
 
 def pptx_to_json(path):
+    from pptx import Presentation
     prs = Presentation(path)
     document = {"document_name": path.split('/')[-1], "content": []}
     
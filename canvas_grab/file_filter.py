@@ -1,4 +1,6 @@
-import questionary
+import re
+from datetime import datetime
+from fnmatch import translate
 from .configurable import Configurable
 from .utils import find_choice
 from .snapshot import SnapshotLink
@@ -11,12 +13,81 @@ FILE_GROUP = {
                  ".xls", ".xlsx", ".pdf", ".epub", ".caj"]
 }
 
+KNOWN_EXTENSIONS = frozenset(
+    ext for group in FILE_GROUP.values() for ext in group)
+
+
+class FileMatcher(object):
+    """Compiled rules of a ``FileFilter``.
+
+    Calling a matcher with a key and a snapshot item tells whether the item is allowed.
+    Extensions are looked up by the suffix of the key in a set, so the cost does not
+    grow with the number of allowed extensions. Links are only checked against
+    ``exclude``, while size and date rules apply to files.
+    """
+
+    def __init__(self, file_filter):
+        self.allow_all = 'All' in file_filter.allowed_group
+        extensions = file_filter.allowed_extensions() if not self.allow_all else []
+        self.suffixes = frozenset(
+            ext for ext in extensions if ext.startswith('.') and ext.count('.') == 1)
+        # extensions like `.tar.gz`, or without a dot, are matched by `endswith`
+        self.long_suffixes = tuple(
+            ext for ext in extensions if ext not in self.suffixes)
+        self.exclude = None
+        if file_filter.exclude:
+            self.exclude = re.compile(
+                '|'.join(translate(pattern) for pattern in file_filter.exclude)).match
+        self.max_size = file_filter.max_size
+        self.modified_after = 0
+        if file_filter.modified_after:
+            self.modified_after = int(datetime.fromisoformat(
+                str(file_filter.modified_after)).timestamp())
+
+    def allows_extension(self, key):
+        if self.allow_all:
+            return True
+        dot = key.rfind('.')
+        if dot != -1 and key[dot:] in self.suffixes:
+            return True
+        return bool(self.long_suffixes) and key.endswith(self.long_suffixes)
+
+    def excludes_title(self, title):
+        """Tell from a name alone, before metadata of the file is requested, that it is excluded
+
+        Only names ending with an extension of ``FILE_GROUP`` which is not allowed are
+        excluded, as module items may be titled differently from their files.
+        """
+        dot = title.rfind('.')
+        return dot != -1 and title[dot:] in KNOWN_EXTENSIONS and not self.allows_extension(title)
+
+    def __call__(self, key, item):
+        if self.exclude is not None and self.exclude(key):
+            return False
+        if isinstance(item, SnapshotLink):
+            return True
+        if not self.allows_extension(key):
+            return False
+        if self.max_size and item.size > self.max_size:
+            return False
+        return item.modified_at >= self.modified_after
+
 
 class FileFilter(Configurable):
+    """FileFilter decides which files on Canvas are downloaded.
+
+    Files are selected by extension groups and ``allowed_extra`` extensions. Files or
+    links whose path matches a glob in ``exclude`` are skipped, as are files larger
+    than ``max_size`` bytes (0 for no limit) and files modified before
+    ``modified_after``, an ISO date such as ``2021-09-01`` (empty for no limit).
+    """
 
     def __init__(self):
         self.allowed_group = ['Image', 'Document']
         self.allowed_extra = []
+        self.exclude = []
+        self.max_size = 0
+        self.modified_after = ''
 
     def allowed_extensions(self):
         exts = []
@@ -25,23 +96,37 @@ class FileFilter(Configurable):
         exts.extend(self.allowed_extra)
         return exts
 
+    def get_matcher(self):
+        """Get a function telling whether a snapshot item is allowed
+
+        Returns:
+            FileMatcher: takes a key and an item, returns True if the item is allowed
+        """
+        return FileMatcher(self)
+
     def filter_files(self, snapshot):
-        if 'All' in self.allowed_group:
-            return snapshot
-        allowed = self.allowed_extensions()
-        return {k: v for k, v in snapshot.items() if any(map(lambda ext: k.endswith(ext), allowed)) or isinstance(v, SnapshotLink)}
+        allows = self.get_matcher()
+        return {k: v for k, v in snapshot.items() if allows(k, v)}
 
     def to_config(self):
         return {
             'allowed_group': self.allowed_group,
-            'allowed_extra': self.allowed_extra
+            'allowed_extra': self.allowed_extra,
+            'exclude': self.exclude,
+            'max_size': self.max_size,
+            'modified_after': self.modified_after
         }
 
     def from_config(self, config):
         self.allowed_group = config['allowed_group']
         self.allowed_extra = config['allowed_extra']
+        self.exclude = config.get('exclude', self.exclude)
+        self.max_size = config.get('max_size', self.max_size)
+        self.modified_after = config.get(
+            'modified_after', self.modified_after)
 
     def interact(self):
+        import questionary
         choices = []
         for key, group in FILE_GROUP.items():
             choices.append(questionary.Choice(
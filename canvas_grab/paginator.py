@@ -0,0 +1,106 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# the largest page size accepted by Canvas
+PER_PAGE = 100
+MAX_WORKERS = 8
+
+page_regex = r'([?&])page=(\d+)(?=&|$)'
+
+
+def get_page_number(url):
+    r = re.search(page_regex, url or '')
+    return int(r.group(2)) if r else None
+
+
+class Paginator(object):
+    """Paginator lists a ``canvasapi.paginated_list.PaginatedList`` with concurrent page requests.
+
+    The first page is requested with the maximum ``per_page``. If its ``Link`` header
+    has a ``last`` relation with a numbered page, all remaining pages are requested
+    concurrently. Otherwise ``next`` links are followed one by one, as canvasapi does.
+    """
+
+    def __init__(self, paginated_list, max_workers=MAX_WORKERS):
+        """Create a paginator
+
+        Args:
+            paginated_list (canvasapi.paginated_list.PaginatedList): the list to fetch. It must not
+                have been iterated yet.
+            max_workers (int, optional): maximum number of pages requested at the same time. Defaults to MAX_WORKERS.
+        """
+        self.paginated_list = paginated_list
+        self.max_workers = max_workers
+        self.requester = paginated_list._requester
+
+    def request(self, url, params):
+        params = dict(params)
+        # canvasapi extends `_kwargs` in place
+        if '_kwargs' in params:
+            params['_kwargs'] = list(params['_kwargs'])
+        return self.requester.request(
+            self.paginated_list._request_method, url,
+            _url=self.paginated_list._url_override, **params)
+
+    def endpoint_of(self, url):
+        """Strip the API base URL from a pagination link, like canvasapi does
+        """
+        regex = r"(?:{}|{})(.*)".format(
+            re.escape(self.requester.base_url),
+            re.escape(self.requester.new_quizzes_url),
+        )
+        return re.search(regex, url).group(1)
+
+    def parse(self, response):
+        paginated_list = self.paginated_list
+        data = response.json()
+        if paginated_list._root:
+            try:
+                data = data[paginated_list._root]
+            except KeyError:
+                raise ValueError(
+                    "The key <{}> does not exist in the response.".format(paginated_list._root))
+        content = []
+        for element in data:
+            if element is not None:
+                element.update(paginated_list._extra_attribs)
+                content.append(paginated_list._content_class(
+                    self.requester, element))
+        return content
+
+    def fetch(self, url):
+        return self.parse(self.request(self.endpoint_of(url), {}))
+
+    def __iter__(self):
+        """Yield elements in order, as soon as the pages holding them arrive
+        """
+        params = dict(self.paginated_list._first_params)
+        params['per_page'] = PER_PAGE
+        response = self.request(self.paginated_list._first_url, params)
+        yield from self.parse(response)
+
+        next_link = response.links.get('next', {}).get('url')
+        last_link = response.links.get('last', {}).get('url')
+        next_page = get_page_number(next_link)
+        last_page = get_page_number(last_link)
+        if next_page is not None and last_page is not None:
+            urls = [re.sub(page_regex, lambda r: f'{r.group(1)}page={page}', last_link)
+                    for page in range(next_page, last_page + 1)]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for content in executor.map(self.fetch, urls):
+                    yield from content
+            return
+
+        while next_link:
+            response = self.request(self.endpoint_of(next_link), {})
+            yield from self.parse(response)
+            next_link = response.links.get('next', {}).get('url')
+
+
+def fetch_all(paginated_list, max_workers=MAX_WORKERS):
+    """Fetch all elements of a ``PaginatedList`` with ``Paginator``
+
+    Returns:
+        list: all elements, in order
+    """
+    return list(Paginator(paginated_list, max_workers))
@@ -1,8 +1,14 @@
-from .snapshot import SnapshotFile, SnapshotLink
+from .snapshot import SnapshotFile
 
 
 class Planner(object):
     """Planner generates a transfer plan from two snapshots
+
+    Files added under a new key are matched by Canvas file ID against local files
+    which are no longer on Canvas under their key. If the local file is the same
+    version, the file was moved or renamed on Canvas, and it is moved locally
+    (``('move', key, (old_key, item))``) instead of being downloaded again. If local
+    files are kept, it is copied (``('copy', key, (old_key, item))``) instead.
     """
 
     def __init__(self, remove_local_file):
@@ -19,28 +25,75 @@ class Planner(object):
         Returns:
             transfer plan
         """
-        snapshot_from_filter = file_filter.filter_files(snapshot_from)
+        return list(self.yield_plan(snapshot_from, snapshot_to, file_filter))
+
+    def yield_plan(self, snapshot_from, snapshot_to, file_filter):
+        """plan a transfer lazily
+
+        Only keys of local files to delete are held in memory, and no filtered copy
+        of the snapshots is made.
+
+        Args:
+            snapshot_from (dict): source snapshot
+            snapshot_to (dict): target snapshot
+            file_filter (canvas_grab.file_filter.FileFilter): file filter
+
+        Yields:
+            plan entries, in the same order as ``plan``
+        """
+        allows = file_filter.get_matcher()
+
+        # local files no longer on Canvas, which may have been moved there
+        gone = snapshot_to.keys() - snapshot_from.keys()
+        by_file_id = {}
+        for key in gone:
+            to_item = snapshot_to[key]
+            if isinstance(to_item, SnapshotFile) and to_item.file_id:
+                by_file_id.setdefault(to_item.file_id, []).append(key)
+        moved = set()
+        move_op = 'move' if self.remove_local_file else 'copy'
+        # local files still on Canvas, but filtered out
+        filtered = set()
 
-        plans = []
         # Add and update files
         for key, from_item in snapshot_from.items():
-            if key not in snapshot_from_filter:
-                plans.append(('ignore', key, from_item))
-            elif key not in snapshot_to:
-                plans.append(('add', key, from_item))
-            else:
-                to_item = snapshot_to[key]
-                if isinstance(from_item, SnapshotFile):
-                    if to_item.size != from_item.size or to_item.modified_at != from_item.modified_at:
-                        plans.append(('update', key, from_item))
-                if isinstance(from_item, SnapshotLink):
-                    content_length = len(from_item.content().encode('utf-8'))
-                    if to_item.size != content_length:
-                        plans.append(('update', key, from_item))
-        for key, to_item in snapshot_to.items():
-            if key not in snapshot_from_filter:
+            if not allows(key, from_item):
+                if key in snapshot_to:
+                    filtered.add(key)
+                yield ('ignore', key, from_item)
+                continue
+            to_item = snapshot_to.get(key)
+            if to_item is None:
+                old_key = self.find_move(by_file_id, moved, snapshot_to, from_item)
+                if old_key is None:
+                    yield ('add', key, from_item)
+                    continue
                 if self.remove_local_file:
-                    plans.append(('delete', key, to_item))
-                else:
-                    plans.append(('try-remove', key, to_item))
-        return plans
+                    moved.add(old_key)
+                yield (move_op, key, (old_key, from_item))
+            elif to_item.size != from_item.size or (isinstance(from_item, SnapshotFile) and to_item.modified_at != from_item.modified_at):
+                yield ('update', key, from_item)
+
+        if not gone and not filtered:
+            return
+        for key, to_item in snapshot_to.items():
+            if key in moved or (key not in gone and key not in filtered):
+                continue
+            if self.remove_local_file:
+                yield ('delete', key, to_item)
+            else:
+                yield ('try-remove', key, to_item)
+
+    def find_move(self, by_file_id, moved, snapshot_to, from_item):
+        """Find a local file no longer on Canvas which holds the same version of ``from_item``
+
+        Returns:
+            str: key of the local file, or None
+        """
+        if not isinstance(from_item, SnapshotFile) or not from_item.file_id:
+            return None
+        for old_key in by_file_id.get(from_item.file_id, ()):
+            to_item = snapshot_to[old_key]
+            if old_key not in moved and to_item.size == from_item.size and to_item.modified_at == from_item.modified_at:
+                return old_key
+        return None
@@ -0,0 +1,184 @@
+import threading
+import time
+from requests.adapters import HTTPAdapter
+
+# Canvas starts every token with a bucket of 700 units
+LOW_WATER = 200
+HIGH_WATER = 400
+
+
+def header_float(response, name):
+    try:
+        return float(response.headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_throttled(response, stream=False):
+    """Tell whether Canvas refused a response because the rate limit bucket is empty
+
+    Canvas answers such requests with 403 and ``403 Forbidden (Rate Limit Exceeded)``.
+    The body of streamed responses is not read, so they are only recognized by
+    ``X-Rate-Limit-Remaining``.
+    """
+    if response.status_code != 403:
+        return False
+    remaining = header_float(response, 'X-Rate-Limit-Remaining')
+    if remaining is not None and remaining <= 0:
+        return True
+    return not stream and b'Rate Limit Exceeded' in response.content
+
+
+class RateLimiter(object):
+    """Limits requests in flight to Canvas with AIMD, following its rate limit headers.
+
+    Canvas reports the budget left in ``X-Rate-Limit-Remaining`` and what a request
+    consumed in ``X-Request-Cost``. While the budget left, less what requests in flight
+    are expected to cost, is above ``high_water``, the limit grows by about one request
+    per round trip, up to ``max_limit``. When it falls under ``low_water``, the limit is
+    halved, at most once per ``cooldown`` seconds. A request throttled with 403 drops
+    the limit to one and pauses new requests for ``backoff`` seconds, doubled on every
+    throttle in a row.
+    """
+
+    def __init__(self, max_limit=16, initial_limit=4, low_water=LOW_WATER, high_water=HIGH_WATER,
+                 cooldown=1, backoff=1, max_backoff=30):
+        """Create a rate limiter
+
+        Args:
+            max_limit (int, optional): maximum requests in flight. Defaults to 16.
+            initial_limit (int, optional): requests in flight before Canvas reports its budget. Defaults to 4.
+            low_water (int, optional): budget under which the limit is halved. Defaults to LOW_WATER.
+            high_water (int, optional): budget over which the limit grows. Defaults to HIGH_WATER.
+            cooldown (int, optional): minimum seconds between two decreases. Defaults to 1.
+            backoff (int, optional): first pause after a throttled request in seconds. Defaults to 1.
+            max_backoff (int, optional): longest pause in seconds. Defaults to 30.
+        """
+        self.max_limit = max_limit
+        self.limit = float(min(initial_limit, max_limit))
+        self.low_water = low_water
+        self.high_water = high_water
+        self.cooldown = cooldown
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.remaining = None
+        self.cost = None
+        self.decreased_at = 0
+        self.resume_at = 0
+        self.throttle_streak = 0
+        self.throttled = 0
+        self.requests = 0
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                delay = self.resume_at - time.monotonic()
+                if delay <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(delay if delay > 0 else None)
+            self.in_flight += 1
+            self.requests += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def observe(self, response, stream=False):
+        """Adjust the limit to the headers of a response
+
+        Returns:
+            bool: True if the request was throttled and should be sent again
+        """
+        remaining = header_float(response, 'X-Rate-Limit-Remaining')
+        cost = header_float(response, 'X-Request-Cost')
+        throttled = is_throttled(response, stream)
+        with self.condition:
+            now = time.monotonic()
+            if remaining is not None:
+                self.remaining = remaining
+            if cost is not None:
+                # smooth the cost, which varies a lot from request to request
+                self.cost = cost if self.cost is None else 0.8 * self.cost + 0.2 * cost
+            if throttled:
+                self.throttled += 1
+                self.limit = 1.0
+                self.decreased_at = now
+                pause = min(self.max_backoff, self.backoff * 2 ** self.throttle_streak)
+                self.resume_at = max(self.resume_at, now + pause)
+                self.throttle_streak += 1
+            elif remaining is not None:
+                self.throttle_streak = 0
+                budget = remaining - (self.cost or 0) * self.in_flight
+                if budget < self.low_water:
+                    if now - self.decreased_at >= self.cooldown:
+                        self.limit = max(1.0, self.limit / 2)
+                        self.decreased_at = now
+                elif budget >= self.high_water:
+                    self.limit = min(float(self.max_limit),
+                                     self.limit + 1 / self.limit)
+            self.condition.notify_all()
+        return throttled
+
+    def state(self):
+        """Get the current state, e.g. for logging
+
+        Returns:
+            dict: ``limit`` and ``in_flight`` requests, last reported ``remaining`` budget,
+                smoothed ``cost`` per request, number of ``requests`` and of ``throttled`` ones,
+                and seconds until new requests are ``paused`` for
+        """
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'remaining': self.remaining,
+                'cost': None if self.cost is None else round(self.cost, 2),
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'paused': max(0.0, round(self.resume_at - time.monotonic(), 2)),
+            }
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter sending requests within the limit of a ``RateLimiter``.
+
+    Throttled requests are sent again, up to ``max_retries_throttled`` times, once the
+    limiter resumes. Streamed requests hold their slot until their headers arrive.
+    """
+
+    def __init__(self, limiter=None, max_retries_throttled=5, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.max_retries_throttled = max_retries_throttled
+
+    def send(self, request, stream=False, **kwargs):
+        if self.limiter is None:
+            return super().send(request, stream=stream, **kwargs)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                response = super().send(request, stream=stream, **kwargs)
+                throttled = self.limiter.observe(response, stream)
+            finally:
+                self.limiter.release()
+            if not throttled or attempt >= self.max_retries_throttled or hasattr(request.body, 'read'):
+                return response
+            response.close()
+            attempt += 1
+
+
+def mount_rate_limiter(session, prefix, limiter, pool_size):
+    """Send requests under ``prefix`` through ``limiter``
+
+    Args:
+        session (requests.Session): session to mount the limiter on
+        prefix (str): URL prefix, e.g. the Canvas endpoint
+        limiter (RateLimiter): limiter to use
+        pool_size (int): connections kept alive by the adapter
+    """
+    session.mount(prefix, RateLimitedAdapter(
+        limiter, pool_connections=pool_size, pool_maxsize=pool_size))
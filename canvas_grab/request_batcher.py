@@ -1,14 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from canvasapi.module import ModuleItem
+from canvasapi.exceptions import CanvasException
+from .paginator import fetch_all
+
+MAX_WORKERS = 8
+
+
 class RequestBatcher:
     """RequestBatcher automatically batches requests with batch API
+
+    Requests which cannot be batched are sent by up to ``max_workers`` threads.
     """
 
-    def __init__(self, course):
+    def __init__(self, course, max_workers=MAX_WORKERS):
         self.course = course
+        self.max_workers = max_workers
         self.cache = {}
 
     def get_tabs(self):
         if 'tabs' not in self.cache:
-            self.cache['tabs'] = [tab.id for tab in self.course.get_tabs()]
+            self.cache['tabs'] = [tab.id for tab in fetch_all(self.course.get_tabs(), self.max_workers)]
 
         return self.cache['tabs']
 
@@ -19,7 +30,7 @@ class RequestBatcher:
         if 'files' not in self.cache:
             self.cache['files'] = {
                 file.id: file
-                for file in self.course.get_files()
+                for file in fetch_all(self.course.get_files(), self.max_workers)
             }
 
         return self.cache['files']
@@ -31,17 +42,48 @@ class RequestBatcher:
         if 'folders' not in self.cache:
             self.cache['folders'] = {
                 folder.id: folder
-                for folder in self.course.get_folders()
+                for folder in fetch_all(self.course.get_folders(), self.max_workers)
             }
 
         return self.cache['folders']
 
     def get_file(self, file_id):
         files = self.get_files()
-        if files is None:
-            return self.course.get_file(file_id)
-        else:
-            return files.get(file_id, self.course.get_file(file_id))
+        if files is not None and file_id in files:
+            return files[file_id]
+
+        self.prefetch_files([file_id])
+        file = self.cache['resolved_files'][file_id]
+        if isinstance(file, CanvasException):
+            raise file
+        return file
+
+    def prefetch_files(self, file_ids):
+        """Resolve files which are not in the file list, so that later ``get_file``
+        calls are answered from cache.
+
+        Files are requested concurrently. Canvas errors are memoized and raised
+        again by ``get_file``.
+
+        Args:
+            file_ids ([int]): IDs of files to resolve
+        """
+        files = self.get_files() or {}
+        resolved = self.cache.setdefault('resolved_files', {})
+        missing = list(dict.fromkeys(
+            file_id for file_id in file_ids
+            if file_id not in files and file_id not in resolved))
+        if not missing:
+            return
+
+        def resolve(file_id):
+            try:
+                return self.course.get_file(file_id)
+            except CanvasException as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            resolved.update(zip(missing, executor.map(resolve, missing)))
 
     def get_modules(self):
         if 'modules' not in self.get_tabs():
@@ -50,16 +92,44 @@ class RequestBatcher:
         if 'modules' not in self.cache:
             self.cache['modules'] = {
                 module.id: module
-                for module in self.course.get_modules()
+                for module in fetch_all(self.course.get_modules(include=['items']), self.max_workers)
             }
 
         return self.cache['modules']
 
+    def get_module_items(self):
+        """Get items of all modules
+
+        Items are returned inline with modules where Canvas allows it. Other modules
+        have their items listed concurrently.
+
+        Returns:
+            dict: module ID to list of ``canvasapi.module.ModuleItem``, in module order.
+                None if module tab is not available.
+        """
+        modules = self.get_modules()
+        if modules is None:
+            return None
+
+        if 'module_items' not in self.cache:
+            def list_items(module):
+                if hasattr(module, 'items'):
+                    return [ModuleItem(module._requester, {**item, 'course_id': module.course_id})
+                            for item in module.items]
+                return fetch_all(module.get_module_items(), self.max_workers)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                items = executor.map(list_items, modules.values())
+                self.cache['module_items'] = dict(zip(modules.keys(), items))
+
+        return self.cache['module_items']
+
     def get_pages(self):
         if 'pages' not in self.get_tabs():
             return None
 
         if 'pages' not in self.cache:
-            self.cache['pages'] = list(self.course.get_pages())
+            self.cache['pages'] = fetch_all(
+                self.course.get_pages(), self.max_workers)
 
         return self.cache['pages']
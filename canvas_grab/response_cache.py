@@ -0,0 +1,165 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from .rate_limiter import RateLimitedAdapter
+
+# headers which describe the encoded body, and are stale once the body is decoded
+DROPPED_HEADERS = ['Content-Encoding', 'Content-Length', 'Transfer-Encoding']
+
+
+class ResponseCache(object):
+    """Persistent cache of Canvas API responses.
+
+    Responses are stored in a SQLite database with their ``ETag`` and ``Last-Modified``
+    validators. Entries older than ``ttl`` seconds are dropped. When the total size of
+    cached bodies exceeds ``max_bytes``, least recently used entries are evicted.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        """Open a response cache
+
+        Args:
+            path (str): path of the SQLite database
+            ttl (int, optional): maximum age of entries in seconds. Defaults to one week.
+            max_bytes (int, optional): maximum total size of cached bodies. Defaults to 64 MiB.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT,
+                    body BLOB, size INTEGER, stored_at REAL, used_at REAL)''')
+            self.conn.execute(
+                'DELETE FROM responses WHERE stored_at < ?', (time.time() - ttl,))
+
+    def key(self, request):
+        """Compute the cache key of a request from its URL, query and credential
+        """
+        h = hashlib.sha256()
+        h.update(request.headers.get('Authorization', '').encode('utf-8'))
+        h.update(b'\0')
+        h.update(request.url.encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        """Get a cached entry
+
+        Returns:
+            tuple: (etag, last_modified, headers, body), or None if not cached or expired
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, headers, body FROM responses WHERE key = ? AND stored_at >= ?',
+                (key, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, headers, body = row
+        return etag, last_modified, json.loads(headers), body
+
+    def put(self, key, response):
+        headers = {k: v for k, v in response.headers.items()
+                   if k not in DROPPED_HEADERS}
+        body = response.content
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                    key, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                    json.dumps(headers), body, len(body), now, now))
+                self.evict()
+
+    def touch(self, key, headers):
+        """Mark an entry as revalidated, updating its headers
+        """
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                self.conn.execute('UPDATE responses SET headers = ?, stored_at = ?, used_at = ? WHERE key = ?',
+                                  (json.dumps(headers), now, now, key))
+
+    def evict(self):
+        total, = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY used_at').fetchall():
+            self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachingAdapter(RateLimitedAdapter):
+    """HTTPAdapter answering GET requests with conditional requests against a ``ResponseCache``.
+
+    Streamed requests, e.g. file downloads, bypass the cache. Requests sent to Canvas,
+    revalidations included, are limited by ``limiter`` if one is given.
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self.cache.key(request)
+        cached = self.cache.get(key)
+        if cached is not None:
+            etag, last_modified, _, _ = cached
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            _, _, headers, body = cached
+            headers.update((k, v) for k, v in response.headers.items()
+                           if k not in DROPPED_HEADERS)
+            self.cache.touch(key, headers)
+            return self.build_cached_response(request, headers, body)
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.cache.put(key, response)
+        return response
+
+    def build_cached_response(self, request, headers, body):
+        response = Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+def mount_response_cache(session, prefix, cache, pool_size, limiter=None):
+    """Serve GET requests under ``prefix`` through ``cache``
+
+    Args:
+        session (requests.Session): session to mount the cache on
+        prefix (str): URL prefix, e.g. the API base URL
+        cache (ResponseCache): cache to use
+        pool_size (int): connections kept alive by the adapter
+        limiter (canvas_grab.rate_limiter.RateLimiter, optional): limiter of requests
+            sent to Canvas. Defaults to None.
+    """
+    session.mount(prefix, CachingAdapter(
+        cache, limiter=limiter, pool_connections=pool_size, pool_maxsize=pool_size))
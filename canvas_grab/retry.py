@@ -0,0 +1,102 @@
+import random
+import threading
+import requests
+
+# statuses worth trying again, as the server may answer differently later
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class IncompleteDownload(Exception):
+    """The connection ended before the whole file was received"""
+    pass
+
+
+def retry_after(exception):
+    """Get the delay asked by a ``Retry-After`` header in seconds, or None
+    """
+    response = getattr(exception, 'response', None)
+    if response is None:
+        return None
+    try:
+        return max(0.0, float(response.headers['Retry-After']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_retryable(exception):
+    """Tell whether a failed download may succeed if tried again
+
+    Timeouts, broken connections, incomplete bodies, 429 and 5xx responses are
+    retryable. Other HTTP errors, e.g. 401 or 404, and local errors such as a full
+    disk are fatal.
+    """
+    if isinstance(exception, requests.HTTPError):
+        response = exception.response
+        return response is not None and response.status_code in RETRYABLE_STATUS
+    if isinstance(exception, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError, IncompleteDownload)):
+        return True
+    return False
+
+
+class RetryBudget(object):
+    """Retries shared by all downloads of a transfer, so that a broken network fails
+    a sync quickly instead of retrying every file to its limit"""
+
+    def __init__(self, retries):
+        self.retries = retries
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Use one retry
+
+        Returns:
+            bool: False if the budget is spent
+        """
+        with self.lock:
+            if self.retries <= 0:
+                return False
+            self.retries -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """Decides whether and when a failed download is tried again.
+
+    A file is tried up to ``attempts`` times as long as the shared ``budget`` lasts.
+    Before attempt ``n`` the policy waits a random delay of up to
+    ``base_delay * 2 ** (n - 1)`` seconds, capped at ``max_delay`` ("full jitter"),
+    so that downloads failing together do not retry together. A longer delay asked by
+    ``Retry-After`` is respected.
+    """
+
+    def __init__(self, attempts=5, base_delay=1, max_delay=60, budget=None):
+        """Create a retry policy
+
+        Args:
+            attempts (int, optional): maximum attempts per file. Defaults to 5.
+            base_delay (int, optional): delay before the first retry is up to this many seconds. Defaults to 1.
+            max_delay (int, optional): longest delay in seconds. Defaults to 60.
+            budget (RetryBudget, optional): retries shared by all files. Defaults to None, unlimited.
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def delay(self, attempt, exception=None):
+        """Get the delay before trying again after ``attempt`` failed attempts
+        """
+        delay = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        asked = retry_after(exception)
+        if asked is not None:
+            delay = max(delay, min(asked, self.max_delay))
+        return delay
+
+    def should_retry(self, attempt, exception):
+        """Tell whether to try again after ``attempt`` failed attempts, taking from the budget if so
+        """
+        if attempt >= self.attempts or not is_retryable(exception):
+            return False
+        return self.budget is None or self.budget.take()
@@ -0,0 +1,42 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """Create a ``requests.Session`` with keep-alive connection pools
+
+    Args:
+        pool_size (int, optional): Connections kept alive per host. Defaults to DEFAULT_POOL_SIZE.
+
+    Returns:
+        requests.Session: the new session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.pool_size = pool_size
+    return session
+
+
+def get_session(pool_size=None):
+    """Get the session shared by Canvas API calls and file downloads
+
+    Args:
+        pool_size (int, optional): If set, the shared session is recreated when it
+            has been created with another pool size. Defaults to None.
+
+    Returns:
+        requests.Session: the shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None or (pool_size is not None and _session.pool_size != pool_size):
+            _session = create_session(pool_size or DEFAULT_POOL_SIZE)
+        return _session
@@ -3,3 +3,4 @@ from .canvas_module_snapshot import CanvasModuleSnapshot
 from .canvas_file_snapshot import CanvasFileSnapshot
 from .snapshot_file import SnapshotFile
 from .snapshot_link import SnapshotLink
+from .manifest import Manifest
@@ -12,18 +12,22 @@ class CanvasFileSnapshot(Snapshot):
 
     ``CanvasFileSnapshot`` generates a snapshot of files on Canvas. In this snapshot mode,
     all files under "File" tab will be scanned as-is. Besides, it will add pages into
-    the snapshot at `pages/xxx` path, if `with_link` option is enabled.
+    the snapshot at `pages/xxx` path, if `with_link` option is enabled. Items rejected
+    by `file_filter` are left out.
     """
 
-    def __init__(self, course, with_link=False):
+    def __init__(self, course, with_link=False, file_filter=None):
         """Create a file-based Canvas snapshot-taker
 
         Args:
             course (canvasapi.course.Course): The course object
             with_link (bool, optional): If true, pages will be included in snapshot. Defaults to False.
+            file_filter (canvas_grab.file_filter.FileFilter, optional): If set, only allowed items
+                will be included in snapshot. Defaults to None.
         """
         self.course = course
         self.with_link = with_link
+        self.file_filter = file_filter
         self.snapshot = {}
 
     def add_to_snapshot(self, key, value):
@@ -55,6 +59,7 @@ class CanvasFileSnapshot(Snapshot):
     def yield_take_snapshot(self):
         course = self.course
         request_batcher = RequestBatcher(course)
+        allows = self.file_filter.get_matcher() if self.file_filter else None
 
         yield (0, '请稍候', '正在获取文件列表')
         files = request_batcher.get_files()
@@ -69,6 +74,8 @@ class CanvasFileSnapshot(Snapshot):
                 folder = folder[len("course files/"):]
             snapshot_file = from_canvas_file(file)
             filename = f'{folder}{normalize_path(snapshot_file.name, file_regex)}'
+            if allows and not allows(filename, snapshot_file):
+                continue
             self.add_to_snapshot(filename, snapshot_file)
 
         print(f'  {len(files)} files in total')
@@ -81,6 +88,8 @@ class CanvasFileSnapshot(Snapshot):
                 key = f'pages/{normalize_path(page.title, file_regex)}.html'
                 value = SnapshotLink(
                     page.title, page.html_url, "Page")
+                if allows and not allows(key, value):
+                    continue
                 self.add_to_snapshot(key, value)
             print(f'  {len(pages)} pages in total')
             yield (0.2, '请稍候', f'共 {len(pages)} 个链接')
@@ -16,18 +16,23 @@ class CanvasModuleSnapshot(Snapshot):
     by module. If "File" tab is available, the snapshot-taker will first acquire all
     files in "File" tab, which batches the requests and greatly improves performance.
     If `with_link` is enabled, pages and external links will be included in snapshot.
+    Items rejected by `file_filter` are left out, and files whose module item title
+    already tells they are excluded are never requested.
     """
 
-    def __init__(self, course, with_link=False):
+    def __init__(self, course, with_link=False, file_filter=None):
         """Create a module-based Canvas snapshot-taker
 
         Args:
             course (canvasapi.course.Course): The course object
             with_link (bool, optional): If true, pages will be included in snapshot. Defaults to False.
+            file_filter (canvas_grab.file_filter.FileFilter, optional): If set, only allowed items
+                will be included in snapshot. Defaults to None.
         """
         self.course = course
         self.snapshot = {}
         self.with_link = with_link
+        self.file_filter = file_filter
 
     def add_to_snapshot(self, key, value):
         """Add a key-value pair into snapshot. If duplicated, this function will report error and ignore the pair.
@@ -55,12 +60,19 @@ class CanvasModuleSnapshot(Snapshot):
     def yield_take_snapshot(self):
         course = self.course
         request_batcher = RequestBatcher(course)
-        accessed_files = []
+        accessed_files = set()
+        allows = self.file_filter.get_matcher() if self.file_filter else None
         yield (0, '请稍候', '正在获取模块列表')
 
         modules = (request_batcher.get_modules() or {}).items()
+        module_items = request_batcher.get_module_items() or {}
+        request_batcher.prefetch_files([
+            item.content_id
+            for items in module_items.values()
+            for item in items
+            if item.type == 'File' and not (allows and allows.excludes_title(item.title))])
         download_idx = 0
-        for _, module in modules:
+        for module_id, module in modules:
             # replace invalid characters in name
             name = re.sub(file_regex, "_", module.name)
             # consolidate spaces
@@ -79,19 +91,25 @@ class CanvasModuleSnapshot(Snapshot):
             yield (download_idx / len(modules) * 0.2, '正在获取模块列表', f'{module_name} (包含 {module_item_count} 个对象)')
             download_idx += 1
 
-            for item in module.get_module_items():
+            for item in module_items[module_id]:
                 if item.type == 'File':
                     file_id = item.content_id
+                    accessed_files.add(file_id)
+                    if allows and allows.excludes_title(item.title):
+                        continue
                     snapshot_file = from_canvas_file(
                         request_batcher.get_file(file_id))
-                    accessed_files.append(file_id)
                     filename = f'{module_name}/{normalize_path(snapshot_file.name, file_regex)}'
+                    if allows and not allows(filename, snapshot_file):
+                        continue
                     self.add_to_snapshot(filename, snapshot_file)
                 if self.with_link:
                     if item.type == 'ExternalUrl' or item.type == 'Page':
                         key = f'{module_name}/{normalize_path(item.title, file_regex)}.html'
                         value = SnapshotLink(
                             item.title, item.html_url, module_name)
+                        if allows and not allows(key, value):
+                            continue
                         self.add_to_snapshot(key, value)
 
         files = request_batcher.get_files()
@@ -101,6 +119,8 @@ class CanvasModuleSnapshot(Snapshot):
                 if file_id not in accessed_files:
                     snapshot_file = from_canvas_file(file)
                     filename = f'unmoduled/{normalize_path(snapshot_file.name, file_regex)}'
+                    if allows and not allows(filename, snapshot_file):
+                        continue
                     self.add_to_snapshot(filename, snapshot_file)
                     unmoduled_files += 1
             print(
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+from .snapshot_file import SnapshotFile
+
+MANIFEST_NAME = '.canvas_grab_manifest.sqlite3'
+
+
+def parent_dir(key):
+    """Get the folder of a snapshot key, '' for the base folder
+    """
+    return key.rpartition('/')[0]
+
+
+class Manifest(object):
+    """Records files written into a folder by canvas_grab.
+
+    The manifest is a SQLite database stored as ``.canvas_grab_manifest.sqlite3``
+    inside the folder. It keeps the size, modification time and Canvas file ID of
+    every file written by ``Transfer``, and the modification time of every folder
+    holding them, so that ``OnDiskSnapshot`` only has to look into folders which
+    changed since the last sync.
+    """
+
+    def __init__(self, base_path):
+        """Open the manifest of a folder
+
+        Args:
+            base_path (str): folder the manifest belongs to
+        """
+        self.base_path = base_path
+        self.path = os.path.join(base_path, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(self.base_path, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    key TEXT PRIMARY KEY, name TEXT, size INTEGER,
+                    modified_at INTEGER, created_at INTEGER, file_id INTEGER);
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY, mtime_ns INTEGER);
+            ''')
+        return self.conn
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def files(self):
+        """Get all recorded files
+
+        Returns:
+            dict: snapshot key to `SnapshotFile`
+        """
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT key, name, size, modified_at, created_at, file_id FROM files').fetchall()
+        return {key: SnapshotFile(name, size, modified_at, created_at, '', file_id)
+                for key, name, size, modified_at, created_at, file_id in rows}
+
+    def directories(self):
+        """Get recorded folder modification times
+
+        Returns:
+            dict: folder relative to base path to ``st_mtime_ns``
+        """
+        with self.lock:
+            return dict(self.connect().execute('SELECT path, mtime_ns FROM dirs'))
+
+    def record(self, key, snapshot_file):
+        """Record a file written at ``key``
+
+        Args:
+            key (str): key or path of the file
+            snapshot_file (SnapshotFile): metadata of the file on disk
+        """
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)', (
+                    key, snapshot_file.name, snapshot_file.size, snapshot_file.modified_at,
+                    snapshot_file.created_at, snapshot_file.file_id))
+
+    def remove(self, key):
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute('DELETE FROM files WHERE key = ?', (key,))
+
+    def replace_all(self, snapshot):
+        """Replace all recorded files, e.g. after a full rescan
+
+        Args:
+            snapshot (dict): snapshot key to `SnapshotFile`
+        """
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute('DELETE FROM files')
+                conn.execute('DELETE FROM dirs')
+                conn.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)', [
+                    (key, item.name, item.size, item.modified_at, item.created_at, item.file_id)
+                    for key, item in snapshot.items()])
+
+    def refresh_directories(self):
+        """Record current modification times of all folders holding recorded files.
+
+        This should be called after everything in the folder has been written, as
+        folders whose modification time changed will be verified on next snapshot.
+        """
+        dirs = {parent_dir(key) for key in self.files()}
+        mtimes = []
+        for path in dirs:
+            try:
+                mtimes.append(
+                    (path, os.stat(os.path.join(self.base_path, path)).st_mtime_ns))
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute('DELETE FROM dirs')
+                conn.executemany('INSERT INTO dirs VALUES (?, ?)', mtimes)
@@ -1,6 +1,11 @@
+import os
+import re
+from dataclasses import replace
+from fnmatch import translate
 from pathlib import Path
 from .snapshot_file import SnapshotFile
 from .snapshot import Snapshot
+from .manifest import parent_dir
 
 
 class OnDiskSnapshot(Snapshot):
@@ -8,15 +13,33 @@ class OnDiskSnapshot(Snapshot):
 
     This snapshot-taker will scan all files inside a folder. On Windows, backslash will be
     replaced by slash.
+
+    If a ``Manifest`` is given, the snapshot is built from files recorded in it instead.
+    Only folders whose modification time changed since the last sync are listed to
+    verify the recorded files. A full scan is done when the manifest does not exist yet
+    or ``full_rescan`` is set, and the manifest is rebuilt from its result.
+
+    Files whose path matches a glob in ``exclude``, such as outputs generated from the
+    downloaded files, are left out of a full scan.
     """
 
-    def __init__(self, base_path):
+    def __init__(self, base_path, manifest=None, full_rescan=False, exclude=None):
         """Create an on-disk snapshot-taker
 
         Args:
             base_path (str): Base path of the snapshot
+            manifest (canvas_grab.snapshot.Manifest, optional): manifest of the folder. Defaults to None.
+            full_rescan (bool, optional): If true, ignore the manifest and scan the whole folder. Defaults to False.
+            exclude ([str], optional): globs of paths, relative to ``base_path``, which are not
+                part of the snapshot. Defaults to None.
         """
         self.base_path = base_path
+        self.manifest = manifest
+        self.full_rescan = full_rescan
+        self.exclude = None
+        if exclude:
+            self.exclude = re.compile(
+                '|'.join(translate(pattern) for pattern in exclude)).match
         self.snapshot = {}
 
     def take_snapshot(self):
@@ -25,13 +48,73 @@ class OnDiskSnapshot(Snapshot):
         Returns:
             dict: snapshot on disk. All objects are of type `SnapshotFile`.
         """
+        if self.manifest is None or self.full_rescan or not self.manifest.exists():
+            self.scan()
+            if self.manifest is not None:
+                self.keep_file_ids()
+                self.manifest.replace_all(self.snapshot)
+        else:
+            self.verify_manifest()
+        return self.snapshot
+
+    def scan(self):
         base = Path(self.base_path)
         for item in base.rglob('*'):
             if item.is_file() and not item.name.startswith('.') and not item.name.endswith('.canvas_tmp'):
+                key = item.relative_to(base).as_posix()
+                if self.exclude is not None and self.exclude(key):
+                    continue
                 stat = item.stat()
-                self.snapshot[item.relative_to(base).as_posix()] = SnapshotFile(
+                self.snapshot[key] = SnapshotFile(
                     item.name, stat.st_size, int(stat.st_mtime))
-        return self.snapshot
+
+    def keep_file_ids(self):
+        """Carry Canvas file IDs over from the manifest to unchanged files, so that
+        moves can still be detected after a full scan
+        """
+        if not self.manifest.exists():
+            return
+        recorded = self.manifest.files()
+        for key, item in self.snapshot.items():
+            old = recorded.get(key)
+            if old is not None and old.size == item.size and old.modified_at == item.modified_at:
+                item.file_id = old.file_id
+
+    def verify_manifest(self):
+        files = self.manifest.files()
+        dirs = self.manifest.directories()
+        by_dir = {}
+        for key in files:
+            by_dir.setdefault(parent_dir(key), []).append(key)
+
+        for folder, keys in by_dir.items():
+            path = os.path.join(self.base_path, folder)
+            try:
+                changed = os.stat(path).st_mtime_ns != dirs.get(folder)
+            except FileNotFoundError:
+                changed = True
+            if not changed:
+                continue
+            try:
+                with os.scandir(path) as it:
+                    entries = {entry.name: entry for entry in it}
+            except FileNotFoundError:
+                entries = {}
+            for key in keys:
+                entry = entries.get(key.rpartition('/')[2])
+                if entry is None or not entry.is_file():
+                    self.manifest.remove(key)
+                    del files[key]
+                    continue
+                stat = entry.stat()
+                item = files[key]
+                if item.size != stat.st_size or item.modified_at != int(stat.st_mtime):
+                    item = replace(item, size=stat.st_size,
+                                   modified_at=int(stat.st_mtime))
+                    self.manifest.record(key, item)
+                    files[key] = item
+
+        self.snapshot = files
 
     def get_snapshot(self):
         """Get the previously-taken snapshot
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import cached_property
 from html import escape
 
 
@@ -26,3 +27,9 @@ class SnapshotLink:
     <p>Redirecting you to <a href="{self.url}">{escape(self.module_name)} - {escape(self.name)}</a></p>
 </body>
 </html>'''
+
+    @cached_property
+    def size(self):
+        """Size of the UTF-8 encoded content, computed once
+        """
+        return len(self.content().encode('utf-8'))
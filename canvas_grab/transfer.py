@@ -1,100 +1,276 @@
 import sys
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from retrying import retry
 from termcolor import colored
 
-from .download_file import download_file as df
+from .archive import Archive
+from .download_file import download_file
+from .retry import RetryPolicy
+from .session import get_session
 from .utils import apply_datetime_attr, truncate_name
 from .snapshot import SnapshotLink, SnapshotFile
 
-TIMEOUT = 3
-ATTEMPT = 3
+# seconds to connect, and to wait for data while downloading
+TIMEOUT = (10, 60)
 
 
-def need_retrying(exception):
-    return not isinstance(exception, KeyboardInterrupt)
+class TransferError(Exception):
+    """Some files of a transfer failed to download.
 
+    Other files were transferred and recorded all the same. ``failures`` maps the
+    key of each failed file to the exception which failed it.
+    """
 
-@retry(retry_on_exception=need_retrying, stop_max_attempt_number=ATTEMPT, wait_fixed=1000)
-def download_file(url, desc, filename, file_size, verbose=False):
-    try:
-        sys.stderr.flush()
-        yield from df(url, desc, filename, file_size, verbose, req_timeout=TIMEOUT)
-        sys.stderr.flush()
-    except KeyboardInterrupt:
-        sys.stderr.flush()
-        raise
-    except Exception as e:
-        sys.stderr.flush()
-        print('  ' + colored(f'Retrying ({e})...', 'red'))
-        raise
+    def __init__(self, failures):
+        super().__init__(f'{len(failures)} files failed to download')
+        self.failures = failures
 
 
 class Transfer(object):
     """Transfer files with Transfer class
+
+    Files are downloaded by a pool of ``max_workers`` threads. Other operations
+    are done on the calling thread in plan order. All downloads go through
+    ``session``, which defaults to the shared session of ``canvas_grab.session``.
+    Files of at least ``segment_threshold`` bytes are downloaded in ``segments``
+    concurrent byte ranges. If a ``BlobStore`` is given, files it already holds
+    are materialized from it instead of being downloaded, and downloaded files
+    are added to it. Failed downloads are tried again as ``retry_policy`` allows,
+    resuming from the bytes already received. Replaced and deleted files are kept in
+    an ``Archive``, which retains ``keep_versions`` versions per file and at most
+    ``archive_max_bytes`` of content. A file failing to download does not stop the
+    others, failures are raised together as ``TransferError`` once the plan is done.
     """
 
+    def __init__(self, max_workers=1, session=None, segments=1, segment_threshold=None, blob_store=None,
+                 timeout=TIMEOUT, retry_policy=None, keep_versions=5, archive_max_bytes=1024 * 1024 * 1024):
+        self.max_workers = max(1, max_workers)
+        self.session = session or get_session()
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.blob_store = blob_store
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.keep_versions = keep_versions
+        self.archive_max_bytes = archive_max_bytes
+
     def create_parent_folder(self, path):
         Path(path).parent.mkdir(parents=True, exist_ok=True)
 
-    def transfer(self, base_path, archive_base_path, plans):
-        for _ in self.yield_transfer(base_path, archive_base_path, plans):
+    def archive_file(self, path, archive):
+        if os.path.isfile(path):
+            archive.store(path)
+
+    def transfer(self, base_path, archive_base_path, plans, manifest=None):
+        for _ in self.yield_transfer(base_path, archive_base_path, plans, manifest):
             pass
 
     def sub_transfer_progress(self, of, total, download_progress):
         return 0.2 + (float(of) + download_progress) / total * 0.8
 
-    def yield_transfer(self, base_path, archive_base_path, plans):
+    def download_task(self, desc, path, archive, plan, progress, idx):
+        self.create_parent_folder(path)
+        self.archive_file(path, archive)
+        if self.blob_store is None:
+            self.download(desc, path, plan, progress, idx)
+            return
+        with self.blob_store.file_lock(plan.file_id):
+            sha256 = self.blob_store.lookup(plan)
+            if sha256 is not None:
+                self.blob_store.materialize(sha256, path, plan.modified_at)
+                apply_datetime_attr(path, plan.created_at, plan.modified_at)
+                progress[idx] = 1.0
+                return
+            self.download(desc, path, plan, progress, idx)
+            self.blob_store.ingest(path, plan)
+
+    def download(self, desc, path, plan, progress, idx):
+        # bytes received per segment, kept across attempts of a segmented download
+        segment_progress = []
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                for download_progress in download_file(plan.url, desc, path, plan.size, req_timeout=self.timeout,
+                                                       session=self.session, modified_at=plan.modified_at,
+                                                       segments=self.segments, segment_threshold=self.segment_threshold,
+                                                       segment_progress=segment_progress):
+                    progress[idx] = download_progress
+                break
+            except Exception as e:
+                if not self.retry_policy.should_retry(attempt, e):
+                    raise
+                delay = self.retry_policy.delay(attempt, e)
+                sys.stderr.flush()
+                print('  ' + colored(f'Retrying {plan.name} in {delay:.1f}s ({e})...', 'red'))
+                time.sleep(delay)
+        apply_datetime_attr(path, plan.created_at, plan.modified_at)
+
+    def report(self, op, key):
+        if op == 'add':
+            print(f'  {colored("+", "green")} {key}')
+            yield (None, None, f'下载 {key}')
+        if op == 'update':
+            print(f'  {colored("=", "green")} {key}')
+            yield (None, None, f'更新 {key}')
+        if op == 'move':
+            print(f'  {colored(">", "green")} {key}')
+            yield (None, None, f'移动 {key}')
+        if op == 'copy':
+            print(f'  {colored("*", "green")} {key}')
+            yield (None, None, f'复制 {key}')
+        if op == 'delete':
+            print(f'  {colored("-", "yellow")} {key}')
+            yield (None, None, f'删除 {key}')
+        if op == 'ignore':
+            print(f'  {colored("? (ignored)", "yellow")} {key}')
+            yield (None, None, f'忽略 {key}')
+        if op == 'try-remove':
+            print(f'  {colored("? (not on remote)", "yellow")} {key}')
+            yield (None, None, f'忽略 {key}')
+
+    def relocate(self, op, old_path, path, archive):
+        """Move or copy a local file to ``path``
+
+        Returns:
+            bool: False if the file to move or copy is gone
+        """
+        if not os.path.isfile(old_path):
+            return False
+        self.create_parent_folder(path)
+        self.archive_file(path, archive)
+        if op == 'move':
+            os.replace(old_path, path)
+        else:
+            try:
+                os.link(old_path, path)
+            except OSError:
+                shutil.copy2(old_path, path)
+        return True
+
+    def record(self, manifest, key, path, plan):
+        if manifest is None:
+            return
+        name = key.rpartition('/')[2]
+        if isinstance(plan, SnapshotFile):
+            manifest.record(key, SnapshotFile(
+                name, plan.size, plan.modified_at, plan.created_at, '', plan.file_id))
+        else:
+            stat = os.stat(path)
+            manifest.record(key, SnapshotFile(
+                name, stat.st_size, int(stat.st_mtime)))
+
+    def yield_transfer(self, base_path, archive_base_path, plans, manifest=None):
+        """Transfer files and report progress
+
+        Args:
+            base_path (str): folder to transfer files into
+            archive_base_path (str): folder of the ``Archive`` keeping replaced and deleted files
+            plans (list): transfer plan generated by ``Planner``
+            manifest (canvas_grab.snapshot.Manifest, optional): if set, files written or removed are
+                recorded in it. Defaults to None.
+
+        Yields:
+            (progress, status_text, progress_text) tuples
+
+        Raises:
+            TransferError: once the plan is done, if some files failed to download
+        """
         yield (None, '传输文件中...', None)
-        for idx, (op, key, plan) in enumerate(plans):
-            path = f'{base_path}/{key}'
-            archive_path = f'{archive_base_path}/{path}'
-
-            if op == 'add' or op == 'update':
-                self.create_parent_folder(path)
-                file_obj = Path(path)
-                if file_obj.exists():
-                    self.create_parent_folder(archive_path)
-                    file_obj.replace(archive_path)
-                if plan.url == '':
-                    print(f'  {colored("? (not available)", "yellow")} {key}')
+        total = len(plans)
+        # progress of in-flight downloads, indexed by plan index. Only the
+        # calling thread adds or removes keys; workers update values.
+        progress = {}
+        pending = {}
+        failures = {}
+        finished = 0
+        archive = Archive(archive_base_path, self.keep_versions,
+                          self.archive_max_bytes)
+
+        def wait_downloads():
+            nonlocal finished
+            done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            yield (self.sub_transfer_progress(finished, total, sum(progress.values())), None, None)
+            for future in done:
+                idx, op, key, path, plan = pending.pop(future)
+                progress.pop(idx)
+                finished += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f'  {colored("! (failed)", "red")} {key}: {e}')
+                    failures[key] = e
+                    if manifest is not None:
+                        # the previous version was archived before downloading
+                        manifest.remove(key)
+                    yield (None, None, f'失败 {key}')
                     continue
-                if isinstance(plan, SnapshotFile):
-                    download_file_task = download_file(
-                        plan.url, f'({idx+1}/{len(plans)}) ' + truncate_name(plan.name), path, plan.size)
-                    for progress in download_file_task:
-                        yield (self.sub_transfer_progress(idx, len(plans), progress), None, None)
-                    apply_datetime_attr(
-                        path, plan.created_at, plan.modified_at)
-                elif isinstance(plan, SnapshotLink):
-                    Path(path).write_text(plan.content(), encoding='utf-8')
-                else:
-                    print(colored('Unsupported snapshot type', 'red'))
-
-            if op == 'delete':
-                file_obj = Path(path)
-                if file_obj.exists():
-                    self.create_parent_folder(archive_path)
-                    file_obj.rename(archive_path)
-
-            if op == 'add':
-                print(f'  {colored("+", "green")} {key}')
-                yield (None, None, f'下载 {key}')
-            if op == 'update':
-                print(f'  {colored("=", "green")} {key}')
-                yield (None, None, f'更新 {key}')
-            if op == 'delete':
-                print(f'  {colored("-", "yellow")} {key}')
-                yield (None, None, f'删除 {key}')
-            if op == 'ignore':
-                print(f'  {colored("? (ignored)", "yellow")} {key}')
-                yield (None, None, f'忽略 {key}')
-            if op == 'try-remove':
-                print(f'  {colored("? (not on remote)", "yellow")} {key}')
-                yield (None, None, f'忽略 {key}')
+                self.record(manifest, key, path, plan)
+                yield from self.report(op, key)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for idx, (op, key, plan) in enumerate(plans):
+                path = f'{base_path}/{key}'
+
+                if op == 'move' or op == 'copy':
+                    old_key, plan = plan
+                    if self.relocate(op, f'{base_path}/{old_key}', path, archive):
+                        if op == 'move' and manifest is not None:
+                            manifest.remove(old_key)
+                        self.record(manifest, key, path, plan)
+                        finished += 1
+                        yield from self.report(op, key)
+                        continue
+                    # the local file is gone, download it instead
+                    op = 'add'
+
+                if op == 'add' or op == 'update':
+                    if isinstance(plan, SnapshotFile) and plan.url != '':
+                        while len(pending) >= self.max_workers:
+                            yield from wait_downloads()
+                        progress[idx] = 0.0
+                        future = executor.submit(
+                            self.download_task, f'({idx+1}/{total}) ' + truncate_name(plan.name),
+                            path, archive, plan, progress, idx)
+                        pending[future] = (idx, op, key, path, plan)
+                        continue
+                    self.create_parent_folder(path)
+                    self.archive_file(path, archive)
+                    if plan.url == '':
+                        if manifest is not None:
+                            manifest.remove(key)
+                        print(f'  {colored("? (not available)", "yellow")} {key}')
+                        finished += 1
+                        continue
+                    if isinstance(plan, SnapshotLink):
+                        Path(path).write_text(plan.content(), encoding='utf-8')
+                        self.record(manifest, key, path, plan)
+                    else:
+                        print(colored('Unsupported snapshot type', 'red'))
+
+                if op == 'delete':
+                    self.archive_file(path, archive)
+                    if manifest is not None:
+                        manifest.remove(key)
+
+                finished += 1
+                yield from self.report(op, key)
+
+            while pending:
+                yield from wait_downloads()
 
+        removed = archive.prune()
+        if removed:
+            print(f'  Removed {removed} old versions from the archive')
+        archive.close()
         self.clean_tree(base_path)
+        if manifest is not None:
+            manifest.refresh_directories()
+        if failures:
+            raise TransferError(failures)
 
     def clean_tree(self, path) -> bool:
         """Remove empty folder recursively.
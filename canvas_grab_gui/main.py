@@ -4,6 +4,7 @@ from PySide6.QtQuick import QQuickView
 from PySide6.QtQml import QQmlApplicationEngine
 import sys
 import os
+from pathlib import Path
 import canvas_grab
 import threading
 from .sync_model import SyncModel
@@ -19,10 +20,12 @@ class Main:
 
     def _canvas_grab_run(self):
         config = self._config
-        canvas = config.endpoint.login()
+        Path(config.download_folder).mkdir(parents=True, exist_ok=True)
+        canvas = config.endpoint.login(
+            f'{config.download_folder}/.canvas_grab_cache.sqlite3')
         user = canvas.get_current_user()
         self._model.on_update_login_user.emit(str(user))
-        courses = list(canvas.get_courses())
+        courses = canvas_grab.paginator.fetch_all(canvas.get_courses())
         available_courses, not_available = canvas_grab.utils.filter_available_courses(
             courses)
         filtered_courses = config.course_filter.get_filter().filter_course(
@@ -35,6 +38,8 @@ class Main:
             f'您已经以 {user} 身份登录。共有 {total_course_count} 门课程需同步，其中 {not_available_count} 门无法访问，{filtered_count} 门已被过滤。')
 
         course_name_parser = canvas_grab.course_parser.CourseParser()
+        blob_store = config.transfer.get_blob_store(config.download_folder)
+        retry_budget = config.transfer.get_retry_budget()
         for idx, course in enumerate(filtered_courses):
             course_name = course.name
             self._model.on_new_course_in_progress.emit(
@@ -43,11 +48,13 @@ class Main:
             parsed_name = course_name_parser.get_parsed_name(course)
             print(f'  Download to {colored(parsed_name, "cyan")}')
             on_disk_path = f'{config.download_folder}/{parsed_name}'
+            manifest = canvas_grab.snapshot.Manifest(on_disk_path)
             on_disk_snapshot = canvas_grab.snapshot.OnDiskSnapshot(
-                on_disk_path).take_snapshot()
+                on_disk_path, manifest).take_snapshot()
 
             # take canvas snapshot
-            mode, canvas_snapshots = config.organize_mode.get_snapshots(course)
+            mode, canvas_snapshots = config.organize_mode.get_snapshots(
+                course, config.file_filter)
             canvas_snapshot = {}
             for canvas_snapshot_obj in canvas_snapshots:
                 try:
@@ -70,18 +77,28 @@ class Main:
                 f'  Updating {len(plans)} objects '))
 
             # start download
-            transfer = canvas_grab.transfer.Transfer()
+            transfer = config.transfer.get_transfer(
+                blob_store, retry_budget)
             transfer_task = transfer.yield_transfer(
-                on_disk_path, f'{config.download_folder}/_canvas_grab_archive', plans)
-
-            for progress_item in transfer_task:
-                (progress, status_text, progress_text) = progress_item
-                self._model.on_download_in_progress.emit(
-                    progress, status_text, progress_text)
+                on_disk_path, f'{config.download_folder}/_canvas_grab_archive', plans, manifest)
+
+            summary = f'更新了 {len(plans)} 个文件。(远程 {len(canvas_snapshot)} -> 本地 {len(on_disk_snapshot)})'
+            try:
+                for progress_item in transfer_task:
+                    (progress, status_text, progress_text) = progress_item
+                    self._model.on_download_in_progress.emit(
+                        progress, status_text, progress_text)
+            except canvas_grab.transfer.TransferError as e:
+                summary = f'{len(e.failures)} 个文件下载失败。' + summary
+            manifest.close()
 
             self._model.on_finish_course.emit(
                 f'{course_name} (ID: {course.id})',
-                f'更新了 {len(plans)} 个文件。(远程 {len(canvas_snapshot)} -> 本地 {len(on_disk_snapshot)})')
+                summary)
+
+        if blob_store is not None:
+            blob_store.collect_garbage()
+            blob_store.close()
 
         if not self._noupdate:
             canvas_grab.version.check_latest_version()
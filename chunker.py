@@ -8,80 +8,308 @@ i.e.
 Save in the BEIR format 
 """
 
+import hashlib
 import json 
 import os 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 MAX_CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+INDEX_NAME = ".canvas_grab_corpus_index.json"
+# Tried in order, the first one found in a piece of text is used to split it
+SEPARATORS = ["\n\n", "\n", " ", ""]
 
-def chunk_with_langchain(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=MAX_CHUNK_SIZE, chunk_overlap=100)
-    chunks = text_splitter.split_text(text)
+def split_spans(text, start, end, separator):
+    """
+    Splits text[start:end] before every occurrence of the separator, keeping the separator at the start of each
+    piece, and returns the non-empty pieces as (start, end) offsets
+    """
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+
+    spans = []
+    piece_start = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > piece_start:
+            spans.append((piece_start, position))
+        piece_start = position
+        position = text.find(separator, position + len(separator), end)
+    if end > piece_start:
+        spans.append((piece_start, end))
+    return spans
+
+def merge_spans(text, spans, chunk_size, chunk_overlap, chunks):
+    """
+    Merges consecutive pieces into chunks of at most chunk_size characters, starting each chunk with up to
+    chunk_overlap characters of pieces from the end of the previous one
+    """
+    first = 0
+    total = 0
+    for idx, (start, end) in enumerate(spans):
+        length = end - start
+        if total + length > chunk_size and idx > first:
+            chunk = text[spans[first][0]:spans[idx - 1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                total -= spans[first][1] - spans[first][0]
+                first += 1
+        total += length
+    if first < len(spans):
+        chunk = text[spans[first][0]:spans[-1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+
+def merge_characters(text, start, end, chunk_size, chunk_overlap, chunks):
+    """
+    merge_spans for single character pieces, which reduces to sliding a chunk_size window over the text
+    """
+    keep = min(chunk_overlap, chunk_size - 1)
+    while start + chunk_size < end:
+        chunk = text[start:start + chunk_size].strip()
+        if chunk:
+            chunks.append(chunk)
+        start += chunk_size - keep
+    chunk = text[start:end].strip()
+    if chunk:
+        chunks.append(chunk)
+
+def split_text(text, chunk_size=MAX_CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS,
+               start=0, end=None, chunks=None):
+    """
+    Recursively splits text into chunks of at most chunk_size characters
+
+    The text is split on the first separator it contains, pieces still too long are split again with the following
+    separators, and the pieces are merged back into overlapping chunks. This produces the same chunks as langchain's
+    RecursiveCharacterTextSplitter with the same settings, but only works on offsets into text until a chunk is emitted
+    """
+    if end is None:
+        end = len(text)
+    if chunks is None:
+        chunks = []
+
+    separator = separators[-1]
+    next_separators = []
+    for idx, candidate in enumerate(separators):
+        if candidate == "":
+            separator = candidate
+            break
+        if text.find(candidate, start, end) != -1:
+            separator = candidate
+            next_separators = separators[idx + 1:]
+            break
+
+    if not separator and chunk_size > 1:
+        merge_characters(text, start, end, chunk_size, chunk_overlap, chunks)
+        return chunks
+
+    good_spans = []
+    for span_start, span_end in split_spans(text, start, end, separator):
+        if span_end - span_start < chunk_size:
+            good_spans.append((span_start, span_end))
+            continue
+        if good_spans:
+            merge_spans(text, good_spans, chunk_size, chunk_overlap, chunks)
+            good_spans = []
+        if not next_separators:
+            chunks.append(text[span_start:span_end])
+        else:
+            split_text(text, chunk_size, chunk_overlap, next_separators, span_start, span_end, chunks)
+    if good_spans:
+        merge_spans(text, good_spans, chunk_size, chunk_overlap, chunks)
     return chunks
 
-def corpus_generator(folder_path, output_path):
+def document_text(content):
     """
-    Will grab every json file in the folder_path and combine them into a single json file with each chunk with an ID
+    Flattens the content of a converted document into a single string
     """
+    # Handling the PDF per page style
+    if type(content) != list:
+        return content
+
+    parts = []
+    for section in content:
+        page_number = section.get("page_number", "")
+        paragraph_number = section.get("paragraph_number", "")
+        slide_number = section.get("slide_number", "")
+
+        if page_number:
+            parts.append(f"\n\nPage {page_number}\n")
+        if paragraph_number:
+            parts.append(f"\n\nParagraph {paragraph_number}\n")
+        if slide_number:
+            parts.append(f"\n\nSlide {slide_number}\n")
 
-    corpus = {}
-    file_list = []
+        parts.append(section["text"])
+    return "".join(parts)
 
+def iter_document_paths(folder_path):
+    """
+    Yields (document_key, file_path) for every converted json file in the folder_path. The document_key is the
+    path of the json file relative to folder_path
+    """
     for root, dirs, files in os.walk(folder_path):
         for file_name in files:
             if file_name.split(".")[-1] != "json":
                 continue
 
-            if file_name == "corpus.json" or file_name == "file_list.json":
+            if file_name == "corpus.json" or file_name == "file_list.json" or file_name.startswith("."):
                 continue
 
             file_path = os.path.join(root, file_name)
-            with open(file_path, "r") as f:
-                data = json.load(f)
-
-            source_document_name = data["document_name"]
-            file_list.append(source_document_name)
-            content = data["content"]
-
-            # Handling the PDF per page style
-            if type(content) == list:
-                c = ""
-                for section in content:
-                    page_number = section.get("page_number", "")
-                    paragraph_number = section.get("paragraph_number", "")
-                    slide_number = section.get("slide_number", "")
-                    
-                    if page_number:
-                        c += f"\n\nPage {page_number}\n"
-                    if paragraph_number:
-                        c += f"\n\nParagraph {paragraph_number}\n"
-                    if slide_number:
-                        c += f"\n\nSlide {slide_number}\n"
-
-                    c += section["text"]
-                content = c
-                
-            chunks = chunk_with_langchain(content)
-
-            for idx, chunk in enumerate(chunks):
-                chunk_id = len(corpus)
-                corpus[chunk_id] = {
-                    "title": f"{source_document_name} - {idx}",
-                    "text": chunk,
-                    "metadata": {
-                        "source_document_name": source_document_name,
-                        "sequence_number": idx
-                    }
-                }
-    # Save the corpus
-    corpus_path = os.path.join(output_path, "corpus.json")
+            yield os.path.relpath(file_path, folder_path).replace(os.sep, "/"), file_path
+
+def load_document(file_path):
+    """
+    Returns (source_document_name, text) of a converted json file
+    """
+    with open(file_path, "r") as f:
+        data = json.load(f)
+    return data["document_name"], document_text(data["content"])
+
+def file_sha256(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_records(document_key, source_document_name, content, split_cache=None):
+    """
+    Chunks a document and returns a list of (chunk_id, chunk) pairs
+
+    Chunk IDs are derived from the document key and the chunk text, so they stay the same as long as the chunk does.
+    Repeated chunks within a document get a counter suffix
+
+    If split_cache is given, the chunks of a text are looked up there first, so copies of a document are only split
+    once
+    """
+    if split_cache is None:
+        chunks = split_text(content)
+    else:
+        content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        if content_hash not in split_cache:
+            split_cache[content_hash] = split_text(content)
+        chunks = split_cache[content_hash]
+
+    document_hash = hashlib.sha1(document_key.encode("utf-8")).hexdigest()[:12]
+    seen = {}
+    records = []
+    for idx, chunk in enumerate(chunks):
+        chunk_id = f"{document_hash}-{hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]}"
+        seen[chunk_id] = seen.get(chunk_id, 0) + 1
+        if seen[chunk_id] > 1:
+            chunk_id = f"{chunk_id}-{seen[chunk_id] - 1}"
+        records.append((chunk_id, {
+            "title": f"{source_document_name} - {idx}",
+            "text": chunk,
+            "metadata": {
+                "source_document_name": source_document_name,
+                "sequence_number": idx
+            }
+        }))
+    return records
+
+def load_index(index_path, corpus_path, corpus_format):
+    """
+    Loads the per-document records of the previous run, or an empty index if the corpus has to be rebuilt
+    """
+    if not os.path.exists(index_path) or not os.path.exists(corpus_path):
+        return {}
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    if index.get("format") != corpus_format:
+        return {}
+    return index["documents"]
+
+def is_unchanged(entry, file_path):
+    """
+    Checks a document json against its index entry, refreshing the recorded stat if only that changed
+    """
+    stat = os.stat(file_path)
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if stat.st_size != entry["size"] or file_sha256(file_path) != entry["sha256"]:
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    return True
+
+def index_entry(file_path, source_document_name, records):
+    stat = os.stat(file_path)
+    return {
+        "document_name": source_document_name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(file_path),
+        "chunk_ids": [chunk_id for chunk_id, _ in records]
+    }
+
+def corpus_generator(folder_path, output_path, streaming=False):
+    """
+    Will grab every json file in the folder_path and combine them into a single json file with each chunk with an ID
+
+    If streaming is set, chunks are written one per line to corpus.jsonl in the BEIR format as documents are
+    processed instead, so only one document is held in memory at a time
+
+    The corpus is maintained incrementally: an index in output_path records which chunks every document produced,
+    only documents whose json changed are chunked again, and chunks of removed documents are deleted
+    """
+
     if not os.path.exists(output_path):
         os.makedirs(output_path)
-    with open(corpus_path, "w") as f:
-        json.dump(corpus, f, indent=4)
+
+    corpus_format = "jsonl" if streaming else "json"
+    corpus_path = os.path.join(output_path, f"corpus.{corpus_format}")
+    index_path = os.path.join(output_path, INDEX_NAME)
+    index = load_index(index_path, corpus_path, corpus_format)
+
+    documents = dict(iter_document_paths(folder_path))
+    new_index = {key: index[key] for key, file_path in documents.items()
+                 if key in index and is_unchanged(index[key], file_path)}
+    kept_ids = {chunk_id for entry in new_index.values() for chunk_id in entry["chunk_ids"]}
+    changed = [key for key in documents if key not in new_index]
+    print(f"Chunking {len(changed)} changed documents, keeping {len(new_index)}")
+    # Files linked from several modules share their text. The cache holds the chunks of every changed document,
+    # so streaming runs, which keep one document in memory at a time, do without it
+    split_cache = None if streaming else {}
+
+    if streaming:
+        tmp_path = corpus_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if index:
+                with open(corpus_path, "r") as old:
+                    for line in old:
+                        if json.loads(line)["_id"] in kept_ids:
+                            f.write(line)
+            for key in changed:
+                source_document_name, content = load_document(documents[key])
+                records = chunk_records(key, source_document_name, content, split_cache)
+                for chunk_id, chunk in records:
+                    f.write(json.dumps({"_id": chunk_id, **chunk}))
+                    f.write("\n")
+                new_index[key] = index_entry(documents[key], source_document_name, records)
+        os.replace(tmp_path, corpus_path)
         print(f"Saved corpus to {corpus_path}")
-    
+    else:
+        corpus = {}
+        if index:
+            with open(corpus_path, "r") as f:
+                corpus = {chunk_id: chunk for chunk_id, chunk in json.load(f).items() if chunk_id in kept_ids}
+        for key in changed:
+            source_document_name, content = load_document(documents[key])
+            records = chunk_records(key, source_document_name, content, split_cache)
+            corpus.update(records)
+            new_index[key] = index_entry(documents[key], source_document_name, records)
+        # Save the corpus
+        with open(corpus_path, "w") as f:
+            json.dump(corpus, f, indent=4)
+            print(f"Saved corpus to {corpus_path}")
+
+    with open(index_path, "w") as f:
+        json.dump({"format": corpus_format, "documents": new_index}, f)
+
     # Write the file list
+    file_list = [entry["document_name"] for entry in new_index.values()]
     file_list_path = os.path.join(output_path, "file_list.json")
     with open(file_list_path, "w") as f:
         json.dump(file_list, f, indent=4)
@@ -1,4 +1,5 @@
 import argparse
+import sys
 from . import canvas_grab
 from canvasapi import Canvas, exceptions
 from termcolor import colored
@@ -6,15 +7,18 @@ from canvasapi.exceptions import ResourceDoesNotExist
 from .canvas_grab.config import Config
 import os
 import json
-from .canvas_grab.file_conversions import convert_file_to_json
 from .chunker import corpus_generator
 from .canvas_grab.utils import normalize_path, file_regex
 import re 
 import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# files written into course folders by create_jsons and corpus_generator
+GENERATED_FILES = ['*.json', 'markdown/*', 'corpus.jsonl', 'corpus.jsonl.tmp']
 
 
 class ClemsonCanvasGrab:
-    def __init__(self, token, download_folder='files'):
+    def __init__(self, token, download_folder='files', full_rescan=False, jsonl_corpus=False):
         self.config = Config()
         self.config.endpoint.endpoint = "https://clemson.instructure.com/"
         self.config.endpoint.api_key = token
@@ -22,13 +26,21 @@ class ClemsonCanvasGrab:
         self.config.file_filter.allowed_group = ['Document']
         self.config.organize_mode.mode = 'module'
 
-        self.canvas = self.config.endpoint.login()
-        self.courses = list(self.canvas.get_courses())
+        os.makedirs(download_folder, exist_ok=True)
+        # Files shared by modules and courses are downloaded and converted once
+        self.blob_store = self.config.transfer.get_blob_store(download_folder)
+        self.retry_budget = self.config.transfer.get_retry_budget()
+        # One pool for all courses, so that courses synced together share its workers
+        self.conversion_pool = self.config.conversion.get_pool()
+        self.canvas = self.config.endpoint.login(
+            f'{download_folder}/.canvas_grab_cache.sqlite3')
+        self.courses = canvas_grab.paginator.fetch_all(self.canvas.get_courses())
         self.available_courses, self.not_available = canvas_grab.utils.filter_available_courses(self.courses)
         self.filtered_courses = self.config.course_filter.get_filter().filter_course(self.available_courses)
 
         self.id_course_map = {course.id: course for course in self.courses}
-        self.parsed_name = None
+        self.full_rescan = full_rescan
+        self.jsonl_corpus = jsonl_corpus
 
 
     def get_course_names(self):
@@ -45,23 +57,74 @@ class ClemsonCanvasGrab:
         assert course is not None, f'Course with id {course_id} not found'
 
         self.conduct_download(course)
+        self.collect_garbage()
+        self.report_rate_limit()
+
+    def sync_courses(self, course_ids, workers=4):
+        """Download and post-process several courses concurrently
+
+        Args:
+            course_ids ([int]): IDs of courses to sync
+            workers (int, optional): number of courses synced at the same time. Defaults to 4.
+
+        Returns:
+            dict: course ID to the exception which failed its sync, for failed courses only
+        """
+        courses = []
+        for course_id in course_ids:
+            course = self.get_course_by_id(course_id)
+            assert course is not None, f'Course with id {course_id} not found'
+            courses.append(course)
+
+        failures = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.conduct_download, course): course
+                       for course in courses}
+            for future in as_completed(futures):
+                course = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(colored(f'Failed to sync {course.name} (ID: {course.id}): {e}', 'red'))
+                    failures[course.id] = e
+        self.collect_garbage()
+        self.report_rate_limit()
+        return failures
+
+    def collect_garbage(self):
+        """Drop files of the blob store which are no longer in any course folder
+        """
+        if self.blob_store is not None:
+            removed = self.blob_store.collect_garbage()
+            if removed:
+                print(f'Removed {removed} unused files from the blob store')
+
+    def report_rate_limit(self):
+        """Print the state of the limiter of requests to Canvas
+        """
+        limiter = self.config.endpoint.rate_limiter
+        if limiter is not None:
+            state = limiter.state()
+            print(f'Canvas requests: {state["requests"]} ({state["throttled"]} throttled), '
+                  f'limit {state["limit"]} in flight, remaining budget {state["remaining"]}')
 
     def conduct_download(self, course):
         config = self.config
         course_name_parser = canvas_grab.course_parser.CourseParser()
         # take on-disk snapshot
-        self.parsed_name = course_name_parser.get_parsed_name(course)
-        parsed_name = self.parsed_name
+        parsed_name = course_name_parser.get_parsed_name(course)
 
         print(f'  Download to {colored(parsed_name, "cyan")}')
         on_disk_path = f'{config.download_folder}/{parsed_name}'
         print("On disk path: ", on_disk_path)
 
+        manifest = canvas_grab.snapshot.Manifest(on_disk_path)
         on_disk_snapshot = canvas_grab.snapshot.OnDiskSnapshot(
-            on_disk_path).take_snapshot()
+            on_disk_path, manifest, self.full_rescan, GENERATED_FILES).take_snapshot()
 
         # take canvas snapshot
-        mode, canvas_snapshots = config.organize_mode.get_snapshots(course)
+        mode, canvas_snapshots = config.organize_mode.get_snapshots(
+            course, config.file_filter)
         canvas_snapshot = {}
         for canvas_snapshot_obj in canvas_snapshots:
             try:
@@ -79,49 +142,115 @@ class ClemsonCanvasGrab:
         print(colored(
             f'  Updating {len(plans)} objects ({len(canvas_snapshot)} remote objects -> {len(on_disk_snapshot)} local objects)'))
         # start download
-        transfer = canvas_grab.transfer.Transfer()
-        transfer.transfer(
-            on_disk_path, f'{config.download_folder}/_canvas_grab_archive', plans)
+        transfer = config.transfer.get_transfer(
+            self.blob_store, self.retry_budget)
+        transfer_error = None
+        try:
+            transfer.transfer(
+                on_disk_path, f'{config.download_folder}/_canvas_grab_archive', plans, manifest)
+        except canvas_grab.transfer.TransferError as e:
+            # process the files which did download, then fail the course
+            transfer_error = e
+
+        self.create_jsons(course, on_disk_path)
+
+        corpus_generator(on_disk_path, on_disk_path, self.jsonl_corpus)
+
+        # folders now hold generated files as well, record their final state
+        manifest.refresh_directories()
+        manifest.close()
+        if transfer_error is not None:
+            raise transfer_error
 
-        self.create_jsons(course)
 
-        corpus_generator(f'{self.config.download_folder}/{self.parsed_name}', f'{self.config.download_folder}/{self.parsed_name}')
+    def save_json(self, conversion_cache, file_path, json_version):
+        root, file_name = os.path.split(file_path)
+        # md_path = os.path.join(md_base_path, f"{file_name.split('.')[0]}.md")
+        json_path = os.path.splitext(file_name)[0] + ".json"
+        json_path = os.path.join(root, json_path)
 
+        # Conversions may be shared by copies with other names
+        document = json.loads(json_version)
+        if document.get("document_name") != file_name:
+            document["document_name"] = file_name
+            json_version = json.dumps(document, indent=4)
 
-    def create_jsons(self, course):
+        print("Saving to json: ", json_path)
+
+        with open(json_path, 'w') as f:
+            f.write(json_version)
+        conversion_cache.record(file_path, json_path)
+
+        # with open(md_path, 'w') as f:
+        #     print("Saving to markdown: ", md_path)
+        #     f.write(json_version)
+
+    def create_jsons(self, course, course_path):
 
         # The markdown directory will be perfectly flat folder full of markdown files
-        md_base_path = f'{self.config.download_folder}/{self.parsed_name}/markdown'
+        md_base_path = f'{course_path}/markdown'
         os.makedirs(md_base_path, exist_ok=True)
+        # Only files which changed since their last conversion are converted again
+        conversion_cache = canvas_grab.conversion_cache.ConversionCache(course_path)
+        sources = set()
+        stale_sources = []
         # Go through all the files in the course and convert it to a json
-        for root, dirs, files in os.walk(f'{self.config.download_folder}/{self.parsed_name}'):
+        for root, dirs, files in os.walk(course_path):
             for file in files:
                 # Check if the file is a json file using glob
                 if file.endswith(".json"):
                     continue
+                # Skip canvas_grab's own metadata
+                if file.startswith("."):
+                    continue
 
                 file_path = os.path.join(root, file)
-                json_version = convert_file_to_json(file_path)
-
-                if not json_version:
-                    print(colored(f'Failed to convert {file_path} to json', 'yellow'))
+                sources.add(file_path)
+                if conversion_cache.is_fresh(file_path):
                     continue
+                stale_sources.append(file_path)
+
+        # Copies of the same file are converted once, and files whose blob was converted
+        # before are not converted at all
+        copies = {}
+        to_convert = []
+        for file_path in stale_sources:
+            if self.blob_store is None:
+                to_convert.append(file_path)
+                continue
+            blob = (canvas_grab.conversion_cache.file_sha256(file_path),
+                    os.path.splitext(file_path)[1])
+            json_version = self.blob_store.get_conversion(*blob)
+            if json_version is not None:
+                self.save_json(conversion_cache, file_path, json_version)
+                continue
+            if blob not in copies:
+                to_convert.append(file_path)
+            copies.setdefault(blob, []).append(file_path)
+        blobs = {paths[0]: blob for blob, paths in copies.items()}
+
+        # Conversions run in worker processes, see ConversionOptions
+        for file_path, json_version, error in self.conversion_pool.convert(to_convert):
+            blob = blobs.get(file_path)
+            file_paths = copies[blob] if blob else [file_path]
+            if not json_version:
+                for path in file_paths:
+                    if error:
+                        print(colored(f'Failed to convert {path} to json ({error})', 'yellow'))
+                    else:
+                        print(colored(f'Failed to convert {path} to json', 'yellow'))
+                    conversion_cache.record(path, None)
+                continue
 
+            if blob:
+                self.blob_store.put_conversion(*blob, json_version)
+            for path in file_paths:
+                self.save_json(conversion_cache, path, json_version)
 
-                file_name = file.split("/")[-1]
-                # md_path = os.path.join(md_base_path, f"{file_name.split('.')[0]}.md")
-                file_path = os.path.splitext(file_name)[0] + ".json"
-                file_path = os.path.join(root, file_path)
-
-
-                print("Saving to json: ", file_path)
-
-                with open(file_path, 'w') as f:
-                    f.write(json_version)
-
-                # with open(md_path, 'w') as f:
-                #     print("Saving to markdown: ", md_path)
-                #     f.write(json_version)
+        # Outputs of deleted files
+        for json_path in conversion_cache.remove_missing(sources):
+            print("Removing stale json: ", json_path)
+        conversion_cache.close()
 
         # Getting all the pages
         pages = course.get_pages(include=['body'])
@@ -136,7 +265,7 @@ class ClemsonCanvasGrab:
                     "content": page.body
                 }
 
-                page_path = f'{self.config.download_folder}/{self.parsed_name}/pages'
+                page_path = f'{course_path}/pages'
                 if not os.path.exists(page_path):
                     os.makedirs(page_path)
 
@@ -156,14 +285,20 @@ class ClemsonCanvasGrab:
     #     course_name = course.name
 
 def main(args):
-    g = ClemsonCanvasGrab(args.token, args.save_path)
+    g = ClemsonCanvasGrab(args.token, args.save_path, args.full_rescan, args.jsonl_corpus)
 
     if args.list_courses:
         print(g.get_course_names())
         return
 
     if args.course_id is not None:
-        g.update_local_course_info(args.course_id)
+        if len(args.course_id) == 1:
+            g.update_local_course_info(args.course_id[0])
+        else:
+            failures = g.sync_courses(args.course_id, args.workers)
+            if failures:
+                print(colored(f'{len(failures)} of {len(args.course_id)} courses failed to sync', 'red'))
+                sys.exit(1)
 
 
 
@@ -173,8 +308,11 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Grab files from Canvas')
     parser.add_argument('--token', type=str, help='Canvas API token', required=True)
     parser.add_argument('--list_courses', action='store_true', help='List course ids')
-    parser.add_argument('--course_id', type=int, help='Canvas course id to download from', default=None)
+    parser.add_argument('--course_id', type=int, nargs='+', help='Canvas course ids to download from', default=None)
+    parser.add_argument('--workers', type=int, help='Number of courses to sync at the same time', default=4)
     parser.add_argument('--save_path', type=str, help='Path to save/update downloaded files, will check the contents of this directory', default='.')
+    parser.add_argument('--full_rescan', action='store_true', help='Scan every local file instead of trusting the manifest of the last sync')
+    parser.add_argument('--jsonl_corpus', action='store_true', help='Stream the corpus to corpus.jsonl, one chunk per line, instead of corpus.json')
 
     args = parser.parse_args()
     main(args)